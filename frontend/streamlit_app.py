@@ -1,17 +1,58 @@
 import streamlit as st
+import asyncio
+import hashlib
+import io
 import os
-from datetime import datetime as dt
+import time
+from datetime import date
+from typing import BinaryIO
 
-from streamlit.runtime.state import session_state
-from period_tracker.app import PeriodTracker
-from period_tracker.utils.audio_recorder import record_audio_until_x
-import tempfile
-from period_tracker.api.server import process_audio
 
-import uuid
+# The tracker, API and recorder modules pull in the ElevenLabs SDK and audio
+# libraries, so they are only imported once the user reaches the voice step.
 
-# Initialize period tracker
-period_tracker = PeriodTracker()
+@st.cache_resource(show_spinner=False)
+def get_tracker():
+    """Return the period tracker shared with the API module, built once per server process"""
+    from period_tracker.api.server import period_tracker
+    # Open the ElevenLabs connection before the first voice note is submitted
+    period_tracker.transcriber.warm_up()
+    return period_tracker
+
+def run_process_audio(audio: BinaryIO, session_id: str) -> dict:
+    """Run the audio pipeline, rendering the transcript and reply as soon as each is ready"""
+    from period_tracker.api.server import process_audio, wait_for_prompt_tasks
+
+    transcript_area = st.empty()
+    reply_area = st.empty()
+
+    async def consume() -> dict:
+        result = {}
+        async for event in process_audio(audio, session_id):
+            if event["type"] == "transcript":
+                transcript_area.write(f"**You said:** {event['text']}")
+            elif event["type"] == "followup":
+                reply_area.write(f"**Assistant:** {event['text']}")
+            elif event["type"] == "result":
+                result = event["result"]
+        # asyncio.run cancels unfinished tasks, so let the speculative replies finish
+        # (and land in the audio cache) before the loop closes
+        await wait_for_prompt_tasks()
+        return result
+
+    return asyncio.run(consume())
+
+@st.fragment(run_every=0.5)
+def recording_status():
+    """Refresh the recording indicator without rerunning the whole page"""
+    recording = st.session_state.get("recording")
+    if recording is None:
+        return
+    elapsed = time.time() - recording["started_at"]
+    if recording["thread"].is_alive():
+        st.write(f"🔴 Recording... {elapsed:.0f}s")
+    else:
+        st.write("Recording stopped. Press Stop Recording to submit it.")
 
 # --- Page Config ---
 st.set_page_config(page_title="RASA: Wellness that Listens", page_icon="🩸", layout="centered")
@@ -23,92 +64,122 @@ if "step" not in st.session_state:
     st.session_state.step = 1
 
 # --- Step 1: Welcome ---
-if st.session_state.step == 1:
+def step_welcome():
     st.title("🩸 RASA: Wellness that Listens")
     st.write("Track your cycle, symptoms, and feelings using your voice.")
     if st.button("Get Started"):
         st.session_state.step = 2
 
 # --- Step 2: Name ---
-elif st.session_state.step == 2:
+def step_name():
     st.title("Step 1: What's your name?")
-    name = st.text_input("Enter your name")
-    if st.button("Next") and name.strip():
-        st.session_state.user_profile["name"] = name
-        st.session_state.step = 3
+    with st.form("step2"):
+        name = st.text_input("Enter your name")
+        if st.form_submit_button("Next") and name.strip():
+            st.session_state.user_profile["name"] = name
+            st.session_state.step = 3
+            st.rerun()
 
 # --- Step 3: Age Range ---
-elif st.session_state.step == 3:
+def step_age_range():
     st.title("Step 2: Select your age range")
-    age_range = st.radio("Choose one", ["18-24", "25-34", "35-44", "45-54", "55+", "Prefer not to say"])
-    if st.button("Next"):
-        st.session_state.user_profile["age_range"] = age_range
-        st.session_state.step = 4
+    with st.form("step3"):
+        age_range = st.radio("Choose one", ["18-24", "25-34", "35-44", "45-54", "55+", "Prefer not to say"])
+        if st.form_submit_button("Next"):
+            st.session_state.user_profile["age_range"] = age_range
+            st.session_state.step = 4
+            st.rerun()
 
 # --- Step 4: Gender ---
-elif st.session_state.step == 4:
+def step_gender():
     st.title("Step 3: How do you identify?")
-    gender = st.radio("Select one", ["Female", "Male", "Non-binary", "Prefer not to say", "Other"])
-    if st.button("Next"):
-        st.session_state.user_profile["gender"] = gender
-        st.session_state.step = 5
+    with st.form("step4"):
+        gender = st.radio("Select one", ["Female", "Male", "Non-binary", "Prefer not to say", "Other"])
+        if st.form_submit_button("Next"):
+            st.session_state.user_profile["gender"] = gender
+            st.session_state.step = 5
+            st.rerun()
 
 # --- Step 5: Tracking Goals ---
-elif st.session_state.step == 5:
+def step_tracking_goals():
     st.title("Step 4: What are you hoping to track?")
-    goals = st.multiselect("Select all that apply:", [
-        "Predicting my period",
-        "Understanding symptoms (cramps, mood, etc.)",
-        "Tracking irregularities",
-        "Trying to conceive / Fertility tracking",
-        "General health awareness",
-        "Something else"
-    ])
-    if st.button("Next"):
-        st.session_state.user_profile["tracking_goals"] = goals
-        st.session_state.step = 6
+    with st.form("step5"):
+        goals = st.multiselect("Select all that apply:", [
+            "Predicting my period",
+            "Understanding symptoms (cramps, mood, etc.)",
+            "Tracking irregularities",
+            "Trying to conceive / Fertility tracking",
+            "General health awareness",
+            "Something else"
+        ])
+        if st.form_submit_button("Next"):
+            st.session_state.user_profile["tracking_goals"] = goals
+            st.session_state.step = 6
+            st.rerun()
 
 # --- Step 6: Last Period Date ---
-elif st.session_state.step == 6:
+def step_last_period():
     st.title("Step 5: When did your last period start?")
-    last_period = st.date_input("Select the date")
-    if st.button("Next"):
-        st.session_state.user_profile["last_period_start"] = str(last_period)
-        st.session_state.step = 7
+    with st.form("step6"):
+        if "last_period_start" not in st.session_state and "last_period_start" in st.session_state.user_profile:
+            st.session_state.last_period_start = date.fromisoformat(st.session_state.user_profile["last_period_start"])
+        st.date_input("Select the date", key="last_period_start")
+        if st.form_submit_button("Next"):
+            st.session_state.user_profile["last_period_start"] = str(st.session_state.last_period_start)
+            st.session_state.step = 7
+            st.rerun()
 
 # --- Step 7: Typical Cycle Length ---
-elif st.session_state.step == 7:
+def step_cycle_length():
     st.title("Step 6: What's your typical cycle length?")
-    cycle_length = st.number_input("Enter days", min_value=15, max_value=60, value=28)
-    if st.button("Next"):
-        st.session_state.user_profile["cycle_length"] = cycle_length
-        st.session_state.step = 8
+    with st.form("step7"):
+        if "cycle_length" not in st.session_state:
+            st.session_state.cycle_length = st.session_state.user_profile.get("cycle_length", 28)
+        st.number_input("Enter days", min_value=15, max_value=60, key="cycle_length")
+        if st.form_submit_button("Next"):
+            st.session_state.user_profile["cycle_length"] = st.session_state.cycle_length
+            st.session_state.step = 8
+            st.rerun()
 
 # --- Step 8: Typical Period Duration ---
-elif st.session_state.step == 8:
+def step_period_duration():
     st.title("Step 7: How long does your period usually last?")
-    period_duration = st.number_input("Enter days", min_value=1, max_value=10, value=5)
-    if st.button("Next"):
-        st.session_state.user_profile["period_duration"] = period_duration
-        st.session_state.step = 9
+    with st.form("step8"):
+        if "period_duration" not in st.session_state:
+            st.session_state.period_duration = st.session_state.user_profile.get("period_duration", 5)
+        st.number_input("Enter days", min_value=1, max_value=10, key="period_duration")
+        if st.form_submit_button("Next"):
+            st.session_state.user_profile["period_duration"] = st.session_state.period_duration
+            st.session_state.step = 9
+            st.rerun()
 
 # --- Step 9: Privacy & Data Usage ---
-elif st.session_state.step == 9:
+def step_privacy():
     st.title("Your Health Data is Private.")
     st.write("We are committed to protecting your personal health information.")
-    share_data = st.checkbox("Help improve the app by sharing anonymous usage data", value=True)
-    if st.button("Finish Setup"):
-        st.session_state.user_profile["share_data"] = share_data
-        st.session_state.step = 10
+    with st.form("step9"):
+        share_data = st.checkbox("Help improve the app by sharing anonymous usage data", value=True)
+        if st.form_submit_button("Finish Setup"):
+            st.session_state.user_profile["share_data"] = share_data
+            st.session_state.step = 10
+            st.rerun()
 
 # --- Step 10: Voice-Based Tracker ---
-elif st.session_state.step == 10:
+def step_voice_tracker():
+    from period_tracker.config.settings import config
+    from period_tracker.utils.audio_recorder import start_background_recording
+    from period_tracker.utils.ids import next_file_name
+
+    period_tracker = get_tracker()
+
     # Initialize session if not already done
     if "session_id" not in st.session_state:
         session_response = period_tracker.start_new_session()
         st.session_state.session_id = session_response["session_id"]
         st.session_state.session_status = "active"
         st.session_state.logs = []
+        st.session_state.missing_data_count = 0
+        st.session_state.unusual_symptoms_count = 0
         
     st.title("🎙️ Voice-Based Period Health Tracker")
     st.write("Speak and submit below. Your voice and logs will be saved for review.")
@@ -120,39 +191,77 @@ elif st.session_state.step == 10:
     else:
         st.write("Status: Completed")
     
-    # Record audio
-    if st.button("Start Recording"):
-        # Create temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-        temp_file.close()
-        
-        # Record audio
-        record_audio_until_x(temp_file.name)
+    # Record audio on a background thread so the page stays responsive
+    recording = st.session_state.get("recording")
+    if recording is None:
+        if st.button("Start Recording"):
+            # Record straight into the data directory so keeping the file needs no move
+            audio_path = os.path.join(config.audio_input_dir, next_file_name(".wav", st.session_state.session_id))
+            
+            thread, stop_event = start_background_recording(audio_path)
+            st.session_state.recording = {
+                "thread": thread,
+                "stop_event": stop_event,
+                "path": audio_path,
+                "started_at": time.time()
+            }
+            st.rerun()
+    else:
+        recording_status()
+    
+    if recording is not None and st.button("Stop Recording"):
+        # Stop the recorder and wait for it to finish writing the WAV file
+        recording["stop_event"].set()
+        recording["thread"].join()
+        del st.session_state["recording"]
         
-        # Process the voice note
-        result = process_audio(temp_file.name)
+        if not os.path.exists(recording["path"]):
+            # The recorder removes the file when nothing was captured, e.g. no input
+            # device or Stop pressed before the first chunk arrived
+            st.warning("No audio was recorded. Check your microphone and try again.")
+        else:
+            with open(recording["path"], "rb") as f:
+                audio_bytes = f.read()
+            audio_hash = hashlib.blake2b(audio_bytes, digest_size=16).hexdigest()
         
-        # Store the log
-        st.session_state.logs.append(result)
+            if st.session_state.get("last_audio_hash") == audio_hash:
+                # Same recording as last time, skip the STT/TTS round trip
+                result = st.session_state.last_result
+            else:
+                # Process the voice note
+                result = run_process_audio(io.BytesIO(audio_bytes), st.session_state.session_id)
+                if result.get("status") == "complete":
+                    st.session_state.session_status = "completed"
+                st.session_state.last_audio_hash = audio_hash
+                st.session_state.last_audio_bytes = audio_bytes
+                st.session_state.last_result = result
+            
+                # Store the log and update the statistics once, instead of rescanning every rerun
+                st.session_state.logs.append(result)
+                if result.get("missing_fields"):
+                    st.session_state.missing_data_count += 1
+                if result.get("has_unusual_symptoms"):
+                    st.session_state.unusual_symptoms_count += 1
         
-        # Show summary
-        st.success(result)
+            # Show summary
+            st.success(result)
         
-        # Show conversation history
-        st.subheader("Conversation History")
-        for msg in result["conversation_history"]:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            st.write(f"**{role}:** {msg["content"]}")
+            # Show conversation history
+            st.subheader("Conversation History")
+            for msg in result.get("conversation_history", []):
+                role = "User" if msg["role"] == "user" else "Assistant"
+                st.write(f"**{role}:** {msg['content']}")
             
-        # Show warnings if any
-        if result.get("missing_fields"):
-            st.warning("Some required information is missing. Please provide more details.")
-        if result.get("has_unusual_symptoms"):
-            st.warning("Unusual symptoms detected. Please consider consulting a healthcare professional.")
+            # Show warnings if any
+            if result.get("missing_fields"):
+                st.warning("Some required information is missing. Please provide more details.")
+            if result.get("has_unusual_symptoms"):
+                st.warning("Unusual symptoms detected. Please consider consulting a healthcare professional.")
                 
     # End session button
     if st.button("End Session"):
-        end_result = period_tracker.end_current_session()
+        # End this browser session's own session; the tracker is shared by every user
+        period_tracker.data_store.end_session(st.session_state.session_id)
         st.session_state.session_status = "completed"
         st.success("Session ended successfully")
         
@@ -160,19 +269,27 @@ elif st.session_state.step == 10:
     st.subheader("Session Statistics")
     if st.session_state.logs:
         st.write(f"Total logs: {len(st.session_state.logs)}")
-        missing_data = sum(1 for log in st.session_state.logs if log.get("missing_fields", []))
-        unusual_symptoms = sum(1 for log in st.session_state.logs if log.get("has_unusual_symptoms", []))
-        st.write(f"Logs with missing data: {missing_data}")
-        st.write(f"Logs with unusual symptoms: {unusual_symptoms}")
-        save_dir = "data/audio"
-        os.makedirs(save_dir, exist_ok=True)
-        timestamp = dt.now().strftime("%Y%m%d_%H%M%S")
-        file_path = st.session_state.logs[-1]["audio_url"]
-
-        st.success(f"Saved your voice as {file_path}")
-        with open(file_path, "rb") as f:
-            audio_data = f.read()
-        st.audio(audio_data, format="audio/wav")
+        st.write(f"Logs with missing data: {st.session_state.missing_data_count}")
+        st.write(f"Logs with unusual symptoms: {st.session_state.unusual_symptoms_count}")
+
+        # Play back the last recording from memory rather than re-reading it from disk
+        st.audio(st.session_state.last_audio_bytes, format="audio/wav")
         st.info("Simulated AI Response Played (replace this with your backend output)")
 
     st.write("You can record again any time without reloading the page.")
+
+# Steps are dispatched by index instead of walking an if/elif chain on every rerun
+STEPS = [
+    step_welcome,
+    step_name,
+    step_age_range,
+    step_gender,
+    step_tracking_goals,
+    step_last_period,
+    step_cycle_length,
+    step_period_duration,
+    step_privacy,
+    step_voice_tracker,
+]
+
+STEPS[st.session_state.step - 1]()
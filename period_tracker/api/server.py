@@ -1,143 +1,294 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse, FileResponse
-from typing import Optional, Dict, Any
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
+from typing import Optional, Dict, Any, AsyncIterator, BinaryIO, List, Tuple, Union
+import asyncio
+import contextlib
+import io
 import os
-import uuid
+import re
 from pathlib import Path
+import orjson
 import uvicorn
 
 from period_tracker.app import PeriodTracker
 from period_tracker.config.settings import config
+from period_tracker.utils.ids import next_file_name
 from period_tracker.utils.text_processor import extract_period_info
-from period_tracker.elevenlabs_transcriber import ElevenLabsTranscriber
 
 # Create router
 router = APIRouter(prefix="/period-tracker")
 
+# Public URL prefix for generated audio files
+AUDIO_URL_PREFIX = "/api/period-tracker/audio"
+
 # Initialize period tracker
 period_tracker = PeriodTracker()
-# Initialize transcriber
-transcriber = ElevenLabsTranscriber()
+# Share the tracker's transcriber instead of building a second ElevenLabs client
+transcriber = period_tracker.transcriber
 
-# Create directories if they don't exist
-os.makedirs(config.audio_input_dir, exist_ok=True)
-os.makedirs(config.audio_output_dir, exist_ok=True)
+THANK_YOU_MESSAGE = "Thank you for sharing your information. I've recorded your period details. Check back in soon!"
+NO_SPEECH_MESSAGE = "I didn't catch that. Could you tell me again how your period is going?"
 
-session_id = None
+# Replies come from a small fixed set of prompts, so each one is synthesized once
+PROMPT_CACHE: Dict[str, str] = {}
+# Syntheses in progress, so concurrent and speculative callers share one request.
+# Tasks belong to the loop that created them and Streamlit runs each request with
+# asyncio.run, so they are only shared between callers on the same loop.
+_prompt_tasks: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Task] = {}
 
-def get_required_fields() -> Dict[str, list]:
-    """Get the required fields for period tracking"""
-    return {
-        "period": ["status", "flow"],
-        "timing": ["date"]
-    }
+async def _synthesize_prompt(text: str) -> str:
+    """Get a prompt's file from the transcriber's disk cache, synthesizing it on a miss"""
+    path = await transcriber.text_to_speech_async(text)
+    PROMPT_CACHE[text] = path
+    return path
 
-def check_missing_fields(period_info: Dict[str, Any]) -> Dict[str, list]:
-    """Check which required fields are missing from the period info"""
-    required = get_required_fields()
-    missing = {}
-    
-    for category, fields in required.items():
-        missing_fields = []
-        for field in fields:
-            if category not in period_info or field not in period_info[category]:
-                missing_fields.append(field)
-        if missing_fields:
-            missing[category] = missing_fields
-    
-    return missing
+def _prompt_task(text: str) -> asyncio.Task:
+    """Return the running loop's in-flight synthesis for a prompt, starting one if needed"""
+    key = (asyncio.get_running_loop(), text)
+    task = _prompt_tasks.get(key)
+    if task is None:
+        task = asyncio.create_task(_synthesize_prompt(text))
+        _prompt_tasks[key] = task
+        task.add_done_callback(lambda _: _prompt_tasks.pop(key, None))
+    return task
+
+async def wait_for_prompt_tasks() -> None:
+    """
+    Wait for the running loop's prompt syntheses to finish. Callers that drive
+    process_audio with asyncio.run call this before the loop closes, since
+    asyncio.run cancels leftover tasks and the speculative replies would be lost.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [task for (task_loop, _), task in list(_prompt_tasks.items()) if task_loop is loop]
+    # Failures surface on the request that actually needs the prompt
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def audio_url(path: str) -> str:
+    """Public URL of a reply audio file served from the audio directory"""
+    return f"{AUDIO_URL_PREFIX}/{os.path.basename(path)}"
+
+async def get_prompt_audio(text: str) -> str:
+    """Return the audio file for a fixed prompt, synthesizing it only the first time"""
+    path = PROMPT_CACHE.get(text)
+    if path is None:
+        # Shielded so a caller giving up doesn't cancel a synthesis others are waiting on
+        path = await asyncio.shield(_prompt_task(text))
+    return path
+
+# Required (category, field) pairs for period tracking, built once
+REQUIRED_FIELDS = frozenset({("period", "status"), ("period", "flow"), ("timing", "date")})
+
+# Follow-up prompt per missing field, in the order they are asked
+FOLLOWUP_QUESTIONS = {
+    ("period", "status"): "Could you tell me if you're starting or ending your period?",
+    ("period", "flow"): "How would you describe your flow? (light, medium, or heavy)",
+    ("timing", "date"): "When did this happen? (e.g., today, yesterday, 2 days ago)",
+}
+
+def check_missing_fields(period_info: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Return the required (category, field) pairs missing from the period info"""
+    present = {
+        (category, field)
+        for category, data in period_info.items() if isinstance(data, dict)
+        for field in data
+    }
+    return sorted(REQUIRED_FIELDS - present)
 
-def generate_followup_question(missing_fields: Dict[str, list]) -> str:
+def generate_followup_question(missing_fields: List[Tuple[str, str]]) -> str:
     """Generate a follow-up question based on missing fields"""
-    questions = []
-    
-    if "period" in missing_fields:
-        if "status" in missing_fields["period"]:
-            questions.append("Could you tell me if you're starting or ending your period?")
-        if "flow" in missing_fields["period"]:
-            questions.append("How would you describe your flow? (light, medium, or heavy)")
-    
-    if "timing" in missing_fields and "date" in missing_fields["timing"]:
-        questions.append("When did this happen? (e.g., today, yesterday, 2 days ago)")
+    questions = [question for field, question in FOLLOWUP_QUESTIONS.items() if field in missing_fields]
     
     if not questions:
         return "Is there anything else you'd like to share about your period?"
     
     return " ".join(questions)
 
+# Replies most turns end with, synthesized speculatively while a transcript is pending:
+# everything captured, only the date missing, or nothing recognized
+SPECULATIVE_PROMPTS = (
+    THANK_YOU_MESSAGE,
+    generate_followup_question([("timing", "date")]),
+    generate_followup_question(list(FOLLOWUP_QUESTIONS)),
+)
+
 @router.get("/")
 async def root():
     """Root endpoint"""
     return {"message": "Period Tracker API is running"}
 
-# @router.post("/process-audio")
-def process_audio(
-    file: str
-):
-    """Process an audio file containing voice input"""
-    global session_id
-    try:
-        # Transcribe audio
-        transcribed_text = transcriber.transcribe_audio(file)
-        
-        # Extract period information
-        period_info = extract_period_info(transcribed_text)
-        
-        # Check for missing required fields
-        missing_fields = check_missing_fields(period_info)
-        
-        if not missing_fields:
-            # All required fields present, store the data
-            if session_id:
-                # Store in session if session exists
-                period_tracker.data_store.add_log_to_session(session_id, period_info)
-                
-                # End the session
-                session_data = period_tracker.end_current_session()
-                
-                # Generate response
-                response_text = "Thank you for sharing your information. I've recorded your period details. Check back in soon!"
-                response_audio = transcriber.text_to_speech(
-                    response_text,
-                    os.path.join(config.audio_output_dir, f"response_{uuid.uuid4()}.mp3")
-                )
-                session_id = None
-                return {
-                    "status": "complete",
-                    "message": response_text,
-                    "audio_url": f"/api/period-tracker/audio/{os.path.basename(response_audio)}",
-                    "period_info": period_info,
-                    "session_data": session_data
-                }
-            else:
-                # No session, just return the period info
-                return {
-                    "status": "complete_no_session",
-                    "period_info": period_info
-                }
-        else:
-            # Missing fields, generate follow-up question
-            followup_question = generate_followup_question(missing_fields)
+async def process_audio(
+    file: Union[str, BinaryIO],
+    session_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Process an audio file containing voice input.
+    
+    Yields events as each stage finishes so callers can render the transcript
+    before the follow-up audio has been synthesized:
+    transcript -> followup -> audio_url -> result (the full response dict).
+    
+    The session is passed in by the caller rather than kept in module state,
+    so concurrent requests for different sessions don't interfere.
+    """
+    # Start synthesizing likely replies that aren't cached yet, so TTS overlaps STT.
+    # They are left to finish even if unused, since the audio is cached for later
+    # requests. On the server's long-lived loop they finish on their own; callers
+    # using asyncio.run must await wait_for_prompt_tasks() before the loop exits.
+    for prompt in SPECULATIVE_PROMPTS:
+        if prompt not in PROMPT_CACHE:
+            _prompt_task(prompt)
+    
+    # Transcribe audio
+    transcribed_text = await transcriber.transcribe_audio_async(file)
+    yield {"type": "transcript", "text": transcribed_text}
+    
+    if not transcribed_text.strip():
+        # Silent or accidental recording, don't spend an LLM call extracting nothing
+        yield {"type": "followup", "text": NO_SPEECH_MESSAGE}
+        yield {"type": "result", "result": {
+            "status": "no_speech",
+            "message": NO_SPEECH_MESSAGE,
+            "session_id": session_id or ""
+        }}
+        return
+    
+    # Extract period information
+    period_info = await asyncio.to_thread(extract_period_info, transcribed_text)
+    
+    # Check for missing required fields
+    missing_fields = check_missing_fields(period_info)
+    
+    if not missing_fields:
+        # All required fields present, store the data
+        if session_id:
+            # Fetch the canned reply audio while the session is being stored
+            tts_task = asyncio.create_task(get_prompt_audio(THANK_YOU_MESSAGE))
             
-            outpath = os.path.join(config.audio_output_dir, f"response_{uuid.uuid4()}.mp3")
-            # Convert question to speech
-            response_audio = transcriber.text_to_speech(
-                followup_question,
-                outpath
-            )
+            # Store in session; there is no await in between, so the updates
+            # apply together on the event loop
+            period_tracker.data_store.add_log_to_session(session_id, period_info)
             
-            return {
-                "status": "needs_more_info",
-                "message": followup_question,
-                "audio_url": outpath,
-                "missing_fields": missing_fields,
-                "session_id": session_id or "",
-                "conversation_history": period_tracker.conversation_handler.conversation_history
-            }
+            # End the session
+            period_tracker.data_store.end_session(session_id)
+            session_data = period_tracker.data_store.get_session_data(session_id)
+            
+            # Generate response
+            response_text = THANK_YOU_MESSAGE
+            yield {"type": "followup", "text": response_text}
             
-    except Exception as e:
-        raise e
+            reply_url = audio_url(await tts_task)
+            yield {"type": "audio_url", "url": reply_url}
+            
+            result = {
+                "status": "complete",
+                "message": response_text,
+                "audio_url": reply_url,
+                "period_info": period_info,
+                "session_data": session_data
+            }
+        else:
+            # No session, just return the period info
+            result = {
+                "status": "complete_no_session",
+                "period_info": period_info
+            }
+    else:
+        # Missing fields, generate follow-up question
+        followup_question = generate_followup_question(missing_fields)
+        
+        # Look up (or synthesize) the question audio in the background while the text goes out
+        tts_task = asyncio.create_task(get_prompt_audio(followup_question))
+        yield {"type": "followup", "text": followup_question}
+        
+        result = {
+            "status": "needs_more_info",
+            "message": followup_question,
+            "missing_fields": missing_fields,
+            "session_id": session_id or "",
+            "conversation_history": period_tracker.conversation_handler.conversation_history
+        }
+        
+        reply_url = audio_url(await tts_task)
+        result["audio_url"] = reply_url
+        yield {"type": "audio_url", "url": reply_url}
+    
+    yield {"type": "result", "result": result}
+
+@router.post("/process-audio")
+async def process_audio_upload(
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None)
+):
+    """Stream the processing of an uploaded voice note as newline-delimited JSON events"""
+    # Reject unknown sessions before any of the stream is sent; this also keeps
+    # client-supplied text out of the upload's file name
+    if session_id and session_id not in period_tracker.data_store.sessions:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    suffix = Path(file.filename or "").suffix or ".wav"
+    audio_path = os.path.join(config.audio_input_dir, "input_" + next_file_name(suffix, session_id))
+    audio_bytes = await file.read()
+    
+    async def event_stream():
+        # Keep a copy of the upload on disk, written while it is transcribed from memory
+        save_task = asyncio.create_task(asyncio.to_thread(Path(audio_path).write_bytes, audio_bytes))
+        try:
+            async for event in process_audio(io.BytesIO(audio_bytes), session_id):
+                yield orjson.dumps(event) + b"\n"
+        finally:
+            await save_task
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+# Synthesized reply files, named by the transcriber's content hash. Recordings and
+# uploads share the audio directory and must never be served.
+REPLY_AUDIO_NAME_RE = re.compile(r"tts_[0-9a-f]{32}\.mp3")
+
+class ReplyAudioFiles(StaticFiles):
+    """
+    Serves only synthesized reply audio from the audio directory, and lets the
+    user's browser (but no shared cache) keep it instead of re-fetching on every play.
+    """
+    async def get_response(self, path: str, scope) -> Response:
+        if not REPLY_AUDIO_NAME_RE.fullmatch(path):
+            raise HTTPException(status_code=404)
+        response = await super().get_response(path, scope)
+        response.headers["Cache-Control"] = "private, max-age=86400"
+        return response
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the ElevenLabs connection when the server starts rather than on import,
+    # so the first request doesn't pay for the TLS handshake
+    transcriber.warm_up()
+    yield
+
+app = FastAPI(title="Period Tracker API", default_response_class=ORJSONResponse, lifespan=lifespan)
+# Explicit origins (no wildcard) and a day-long max_age so browsers cache the
+# preflight instead of sending an OPTIONS request before every audio upload
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=os.getenv("FRONTEND_ORIGINS", "http://localhost:8501").split(","),
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "Authorization"],
+    allow_credentials=True,
+    max_age=86400,
+)
+app.include_router(router, prefix="/api")
+# Serve generated reply audio at the URLs handed out by process_audio. PeriodTracker
+# creates the directory on construction, so skip StaticFiles' own existence check.
+app.mount(AUDIO_URL_PREFIX, ReplyAudioFiles(directory=config.audio_output_dir, check_dir=False), name="audio")
 
-# if __name__ == "__main__":
-#     uvicorn.run(router, host="0.0.0.0", port=8000)
-    
\ No newline at end of file
+if __name__ == "__main__":
+    # Sessions live in process memory, so keep WEB_CONCURRENCY at 1 unless
+    # requests for a session are pinned to one worker.
+    uvicorn.run(
+        "period_tracker.api.server:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        reload=os.getenv("DEV") == "1",
+    )
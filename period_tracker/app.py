@@ -1,25 +1,37 @@
+import asyncio
 import os
-import uuid
-from datetime import datetime
-from typing import Dict, Any
+import shutil
+import threading
+from functools import cached_property
+from typing import Dict, Any, List
 
 from period_tracker.elevenlabs_transcriber import ElevenLabsTranscriber
-from period_tracker.config.settings import config
-from period_tracker.utils.audio_recorder import record_audio_until_x
-from period_tracker.utils.text_processor import extract_period_info, format_period_summary
+from period_tracker.config.settings import config, ensure_data_dirs
+from period_tracker.utils.audio_recorder import encode_wav, record_audio_until_x
 from period_tracker.utils.voice_conversation_handler import VoiceConversationHandler
 from period_tracker.utils.data_store import PeriodDataStore
-from elevenlabs import play
+from period_tracker.utils.ids import next_file_name
 
 class PeriodTracker:
     def __init__(self):
         """Initialize the period tracker with session management"""
         # Initialize data store
         self.data_store = PeriodDataStore()
-        # Initialize conversation handler
-        self.conversation_handler = VoiceConversationHandler()
+        # Single transcriber so the ElevenLabs client (and its HTTP pool) is reused
+        self.transcriber = ElevenLabsTranscriber()
         # Initialize current session
         self.current_session_id = None
+        # Create the audio directories so recordings and replies can be
+        # written straight to their final paths
+        ensure_data_dirs()
+        
+    @cached_property
+    def conversation_handler(self) -> VoiceConversationHandler:
+        """
+        Conversation handler, built on first use. It creates its own output
+        directory, data store and session, which most code paths never need.
+        """
+        return VoiceConversationHandler(transcriber=self.transcriber)
         
     def start_new_session(self) -> Dict:
         """Start a new session for a new interaction"""
@@ -52,6 +64,10 @@ class PeriodTracker:
             "has_unusual_symptoms": session_data["has_unusual_symptoms"]
         }
 
+    def get_recent_logs(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Return the most recent logs with their precomputed summaries, newest first"""
+        return self.data_store.get_recent_logs(limit)
+
     def generate_voice_response(self, text: str) -> Dict[str, Any]:
         """
         Generate a voice response using ElevenLabs API.
@@ -60,39 +76,57 @@ class PeriodTracker:
             text: The text to convert to speech.
             
         Returns:
-            Dict containing the generated audio file path and metadata.
-            
-        Raises:
-            requests.exceptions.RequestException: If the API request fails.
-            ValueError: If the API response doesn't contain the expected data.
+            Dict containing the audio file path, metadata and an "audio" iterator of
+            MP3 chunks. Synthesis starts when the iterator is consumed (e.g. by
+            elevenlabs.stream), and the file is written once it has been played.
+            API errors (httpx.HTTPError or the SDK's ApiError) are raised while
+            the iterator is consumed, not by this call.
         """
-        try:
-            output_file_name = uuid.uuid4().hex + ".mp3"
-            outpath = os.path.join(config.audio_output_dir, output_file_name)
-            audio_gen = ElevenLabsTranscriber().text_to_speech(
-                text=text,
-                outpath=outpath
-            )
-            return {
-                "audio_file_path": outpath,
-                "text": text,
-                "audio": audio_gen
-            }
-        except Exception as e:
-            return {"error": f"Failed to generate voice response: {str(e)}"}
+        output_file_name = next_file_name(".mp3", self.current_session_id)
+        outpath = os.path.join(config.audio_output_dir, output_file_name)
+        audio_stream = self.transcriber.text_to_speech_stream(
+            text=text,
+            outpath=outpath
+        )
+        return {
+            "audio_file_path": outpath,
+            "text": text,
+            "audio": audio_stream
+        }
     
-    def process_voice_note(self, audio_file_path: str) -> Dict[str, Any]:
-        return ElevenLabsTranscriber().transcribe_audio(audio_file_path)
+    async def process_voice_note(self, audio_file_path: str) -> str:
+        """Transcribe a recorded voice note on the pooled async client"""
+        return await self.transcriber.transcribe_audio_async(audio_file_path)
     
 
-    def transcribe_voice_note(self) -> str:
+    async def transcribe_voice_note(self) -> str:
         """
-        Record a voice note using the system's default microphone.
-        Returns the path to the recorded audio file.
+        Record a voice note using the system's default microphone and transcribe it.
+        
+        Segments are sent for transcription while the user is still speaking, so
+        once recording stops only the last segment is left to wait for.
+        Returns the transcribed text.
         """
-        print("Recording... (Press 'x' to stop early)")
-        audio_file_path = record_audio_until_x(uuid.uuid4().hex + ".wav")
-        return self.process_voice_note(audio_file_path)
+        loop = asyncio.get_running_loop()
+        segment_futures = []
+        
+        def on_segment(audio) -> None:
+            # Runs on the recording thread; schedule the upload on the event loop
+            segment_futures.append(asyncio.run_coroutine_threadsafe(
+                self.transcriber.transcribe_audio_async(encode_wav(audio)), loop
+            ))
+        
+        print("Recording... (Press 'x' or pause to stop)")
+        audio_path = os.path.join(config.audio_input_dir, next_file_name(".wav", self.current_session_id))
+        stop_event = threading.Event()
+        try:
+            await asyncio.to_thread(record_audio_until_x, audio_path, stop_event, on_segment, True)
+        finally:
+            # If the await is cancelled (e.g. Ctrl-C), stop the microphone and restore the
+            # terminal; asyncio.run waits for the recording thread before it returns
+            stop_event.set()
+        texts = await asyncio.gather(*(asyncio.wrap_future(future) for future in segment_futures))
+        return " ".join(text.strip() for text in texts if text)
 
 def main():
     """Main entry point for the period tracker CLI"""
@@ -100,22 +134,50 @@ def main():
     print("----------------------------------------")
     
     tracker = PeriodTracker()
+    # Open the ElevenLabs connection in the background so the first voice note is faster
+    tracker.transcriber.warm_up()
+    # Replies play on background threads so the menu comes back immediately;
+    # the lock makes queued replies play one after another
+    playback_lock = threading.Lock()
+    playback_threads = []
+    
+    def play_response(audio) -> None:
+        from elevenlabs import play, stream
+        with playback_lock:
+            # Synthesis happens while the stream is consumed, so API errors surface here
+            try:
+                if shutil.which("mpv"):
+                    # Starts playing on the first chunk
+                    stream(audio)
+                else:
+                    # ffplay (via play) needs the whole MP3 before it starts
+                    play(audio)
+            except Exception as e:
+                print(f"\nError: Failed to generate voice response: {e}")
+    
+    def wait_for_playback() -> None:
+        for thread in playback_threads:
+            thread.join()
+        playback_threads.clear()
     
     try:
         while True:
             print("\nOptions:")
             print("1. Record a new voice note")
-            print("2. Exit")
+            print("2. View recent logs")
             print("3. Generate voice response")
+            print("4. Exit")
             
-            choice = input("Enter your choice (1-3): ").strip()
+            choice = input("Enter your choice (1-4): ").strip()
             
             if choice == "1":
+                # Don't record the reply that is still playing
+                wait_for_playback()
                 print("\nPreparing to record your voice note...")                
-                result = tracker.transcribe_voice_note()
+                result = asyncio.run(tracker.transcribe_voice_note())
                 
-                if "error" in result:
-                    print(f"Error: {result['error']}")
+                if not result:
+                    print("No speech detected. Please try again.")
                 else:
                     print("\nSuccessfully logged your entry!")
                     print("\nSummary:")
@@ -134,17 +196,18 @@ def main():
                     print("-" * 30)
                     print(log['summary'])
             
-            elif choice == "2":
-                print("Thank you for using Period Tracker!")
-                break
-
             elif choice == "3":
                 result = tracker.generate_voice_response("Hello, how are you?")
-                if "error" in result:
-                    print(f"Error: {result['error']}")
-                else:
-                    print("\nPlaying voice note...")
-                    play(result['audio'])
+                print("\nPlaying voice note...")
+                playback_threads[:] = [thread for thread in playback_threads if thread.is_alive()]
+                thread = threading.Thread(target=play_response, args=(result['audio'],), daemon=True)
+                thread.start()
+                playback_threads.append(thread)
+            
+            elif choice == "4":
+                wait_for_playback()
+                print("Thank you for using Period Tracker!")
+                break
             
             else:
                 print("Invalid choice. Please try again.")
@@ -0,0 +1,12 @@
+import functools
+
+@functools.cache
+def load_env() -> bool:
+    """
+    Load variables from the .env file into the environment.
+
+    Several modules need the API keys at import time; the file is only read
+    the first time this is called, later calls return immediately.
+    """
+    import dotenv
+    return dotenv.load_dotenv()
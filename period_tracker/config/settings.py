@@ -1,8 +1,12 @@
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any
+from dataclasses import dataclass, field, fields, MISSING
+from typing import List, Optional, Dict
 from enum import Enum
+import functools
 import os
-from pathlib import Path
+
+import msgspec
+
+from .env import load_env
 
 class PeriodFlow(str, Enum):
     NONE = "none"
@@ -21,29 +25,41 @@ class Mood(str, Enum):
     BLOATED = "bloated"
     OTHER = "other"
 
-class PeriodLog(BaseModel):
+class PeriodLog(msgspec.Struct):
+    # Constructing a PeriodLog doesn't validate; decode untrusted JSON with PERIOD_LOG_DECODER
     user_id: str
     date: str
-    flow: PeriodFlow = Field(..., description="Menstrual flow intensity")
-    mood: List[Mood] = Field(default_factory=list, description="List of moods/feelings")
-    spotting: bool = Field(False, description="Whether there's any spotting")
-    notes: Optional[str] = Field(None, description="Additional notes or symptoms")
-    symptoms: List[str] = Field(default_factory=list, description="List of symptoms")
-    voice_note_path: Optional[str] = Field(None, description="Path to the voice recording")
-    transcribed_text: Optional[str] = Field(None, description="Transcribed text from voice note")
+    flow: PeriodFlow                        # Menstrual flow intensity
+    mood: List[Mood] = []                   # List of moods/feelings
+    spotting: bool = False                  # Whether there's any spotting
+    notes: Optional[str] = None             # Additional notes or symptoms
+    symptoms: List[str] = []                # List of symptoms
+    voice_note_path: Optional[str] = None   # Path to the voice recording
+    transcribed_text: Optional[str] = None  # Transcribed text from voice note
+
+# Built once and reused, decoding and validating JSON straight into PeriodLog
+PERIOD_LOG_DECODER = msgspec.json.Decoder(PeriodLog)
 
-class AppConfig(BaseModel):
+# Scalar AppConfig fields can be overridden with PERIOD_TRACKER_<FIELD NAME> variables
+ENV_PREFIX = "PERIOD_TRACKER_"
+
+@dataclass(frozen=True, slots=True)
+class AppConfig:
     # Database configuration
     database_url: str = "sqlite:///period_tracker.db"
     
     # Voice settings
     voice_id: str = "21m00Tcm4TlvDq8ikWAM"  # Default voice ID (Rachel)
-    model_id: str = "eleven_monolingual_v1"
+    # Flash models have the streaming latency optimizations built in; use
+    # "eleven_multilingual_v2" for higher quality at the cost of first-byte latency
+    model_id: str = "eleven_flash_v2_5"
+    # 0 (off) to 4 (max); only worth setting for older models, leave unset for flash/turbo
+    optimize_streaming_latency: Optional[int] = field(default=None, metadata={"parse": int})
     audio_output_dir: str = "data/audio"
     audio_input_dir: str = "data/audio"
     
     # Text processing
-    keywords: Dict[str, List[str]] = {
+    keywords: Dict[str, List[str]] = field(default_factory=lambda: {
         "flow_light": ["light flow", "light period", "light bleeding"],
         "flow_medium": ["medium flow", "normal flow", "regular flow"],
         "flow_heavy": ["heavy flow", "heavy period", "heavy bleeding"],
@@ -53,14 +69,38 @@ class AppConfig(BaseModel):
         "mood_anxious": ["anxious", "nervous", "worried", "stressed"],
         "mood_cramps": ["cramps", "cramping", "pain", "ache"],
         "mood_bloated": ["bloated", "bloating", "swollen"],
-    }
-    
-    class Config:
-        env_file = ".env"
-        env_prefix = "PERIOD_TRACKER_"
+    })
 
-# Create data directories
-os.makedirs(os.path.join(os.path.dirname(__file__), "../../data/audio"), exist_ok=True)
+@functools.lru_cache(maxsize=1)
+def get_config() -> AppConfig:
+    """
+    Return the application config, built once per process from the defaults
+    above and any PERIOD_TRACKER_* environment variables (including .env).
+    """
+    load_env()
+    overrides = {}
+    for config_field in fields(AppConfig):
+        if config_field.default_factory is not MISSING:
+            # Structured defaults such as keywords aren't read from the environment
+            continue
+        env_name = ENV_PREFIX + config_field.name.upper()
+        value = os.getenv(env_name)
+        if value is None:
+            continue
+        try:
+            overrides[config_field.name] = config_field.metadata.get("parse", str)(value)
+        except ValueError as e:
+            raise ValueError(f"Invalid value for {env_name}: {value!r} ({e})") from e
+    return AppConfig(**overrides)
 
 # Load configuration
-config = AppConfig()
+config = get_config()
+
+@functools.cache
+def ensure_data_dirs() -> None:
+    """
+    Create the configured audio directories. Call this from entry points rather
+    than at import; it only touches the filesystem the first time.
+    """
+    os.makedirs(config.audio_input_dir, exist_ok=True)
+    os.makedirs(config.audio_output_dir, exist_ok=True)
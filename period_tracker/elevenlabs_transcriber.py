@@ -1,15 +1,76 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
 import os
-from typing import Optional, Union
-import requests
-from pathlib import Path
-from elevenlabs.client import ElevenLabs
-from elevenlabs import VoiceSettings
+import shutil
+import threading
+from typing import TYPE_CHECKING, Awaitable, BinaryIO, Iterator, List, Optional, TypeVar, Union
+import httpx
 
-import io
+from period_tracker.config.settings import config, ensure_data_dirs
+from period_tracker.utils.ids import next_file_name
+
+import aiofiles
+
+# The elevenlabs SDK is imported where a client is first built rather than here:
+# it is a large import, and modules that only need cache paths shouldn't pay for it
+if TYPE_CHECKING:
+    from elevenlabs import VoiceSettings
+    from elevenlabs.client import AsyncElevenLabs
 
 # load api key from .env file
-import dotenv
-dotenv.load_dotenv()
+from period_tracker.config.env import load_env
+load_env()
+
+# Connection pool settings for the SDK clients. httpx drops idle connections after
+# 5 s by default; keeping them for a minute lets consecutive voice notes and replies
+# reuse the TLS session instead of reconnecting to api.elevenlabs.io.
+HTTP_LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=60)
+HTTP_TIMEOUT = 240  # seconds, the SDK's own default
+T = TypeVar("T")
+
+# Upper bound on transcriptions transcribe_many keeps in flight, matching the pool size
+MAX_CONCURRENT_TRANSCRIPTIONS = HTTP_LIMITS.max_connections
+
+# The SDK yields audio 1 KB at a time unless told otherwise. When saving to a file
+# nothing waits on the first chunk, so larger reads mean far fewer writes (and, for
+# aiofiles, far fewer thread-pool hops). Playback streams keep the small default.
+DOWNLOAD_REQUEST_OPTIONS = {"chunk_size": 64 * 1024}
+
+@functools.cache
+def default_voice_settings() -> "VoiceSettings":
+    """Voice settings shared by the sync and async text-to-speech calls"""
+    from elevenlabs import VoiceSettings
+    return VoiceSettings(
+        stability=0.0,
+        similarity_boost=1.0,
+        style=0.0,
+        use_speaker_boost=True,
+        speed=0.85,
+    )
+
+def _partial_path(cache_path: str) -> str:
+    """Unique temporary name next to a cache file, so concurrent writers don't collide"""
+    # The cache lives in the audio output directory, which may not exist yet when
+    # the transcriber is used without a PeriodTracker
+    ensure_data_dirs()
+    return f"{cache_path}.{next_file_name('.part')}"
+
+@contextlib.contextmanager
+def _cache_writer(cache_path: str):
+    """
+    Open a temporary file that replaces cache_path only once writing finishes,
+    so an interrupted download is never served from the cache.
+    """
+    partial_path = _partial_path(cache_path)
+    try:
+        with open(partial_path, "wb") as f:
+            yield f
+        os.replace(partial_path, cache_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
 
 
 class ElevenLabsTranscriber:
@@ -33,62 +94,242 @@ class ElevenLabsTranscriber:
                 "API key is required. Either pass it to the constructor or set the "
                 "ELEVEN_LABS_API_KEY environment variable."
             )
-        self.client = ElevenLabs(api_key=self.api_key)
+        from elevenlabs.client import ElevenLabs
+        self.client = ElevenLabs(
+            api_key=self.api_key,
+            httpx_client=httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+        )
+        # The async client (and its httpx connection pool) is bound to the event loop it
+        # is used on. Callers such as Streamlit and the CLI start a new loop per request
+        # with asyncio.run, so the client lives on one long-lived loop of its own instead,
+        # started on first use, and async calls are handed over to it.
+        self._async_client = None
+        self._client_loop = None
+        self._client_loop_lock = threading.Lock()
+        # Options for the configured voice and model, and the cache-key prefix derived
+        # from them, built once; only calls that override the voice or model rebuild them
+        self._default_tts_options = self._build_tts_options(config.voice_id, config.model_id)
+        self._default_tts_key = repr(self._default_tts_options)
+    
+    def _get_client_loop(self) -> asyncio.AbstractEventLoop:
+        """Return the event loop that owns the async client, starting it on a daemon thread"""
+        with self._client_loop_lock:
+            if self._client_loop is None:
+                self._client_loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._client_loop.run_forever, name="elevenlabs-client", daemon=True
+                ).start()
+            return self._client_loop
+    
+    async def _run_on_client_loop(self, coro: Awaitable[T]) -> T:
+        """Run a coroutine on the client loop and wait for it from the caller's loop"""
+        loop = self._get_client_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        # Cancelling the caller's await also cancels the coroutine on the client loop
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+    
+    def _get_async_client(self) -> "AsyncElevenLabs":
+        """Return the pooled async client; only call this on the client loop"""
+        if self._async_client is None:
+            from elevenlabs.client import AsyncElevenLabs
+            self._async_client = AsyncElevenLabs(
+                api_key=self.api_key,
+                httpx_client=httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+            )
+        return self._async_client
+    
+    def warm_up(self) -> None:
+        """
+        Open the async client's HTTPS connection ahead of time with a cheap request,
+        so the first transcription or reply on the async paths doesn't pay for the
+        TLS handshake. Returns straight away; the request runs on the client loop.
+        Best effort: failures are ignored and surface on the real call.
+        """
+        async def list_models() -> None:
+            try:
+                await self._get_async_client().models.list()
+            except Exception:
+                pass
+        
+        asyncio.run_coroutine_threadsafe(list_models(), self._get_client_loop())
+    
+    def _build_tts_options(self, voice_id: str, model_id: str) -> dict:
+        """Build the text-to-speech request options for a voice and model"""
+        options = {
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "output_format": "mp3_44100_128",
+            "voice_settings": default_voice_settings(),
+        }
+        if config.optimize_streaming_latency is not None:
+            options["optimize_streaming_latency"] = config.optimize_streaming_latency
+        return options
+    
+    def _tts_options(self, voice_id: Optional[str], model_id: Optional[str]) -> dict:
+        """Return the request options, falling back to the configured voice and model. Don't mutate the result."""
+        if (voice_id or config.voice_id) == config.voice_id and (model_id or config.model_id) == config.model_id:
+            return self._default_tts_options
+        return self._build_tts_options(voice_id or config.voice_id, model_id or config.model_id)
+    
+    def tts_cache_path(self, text: str, voice_id: Optional[str] = None, model_id: Optional[str] = None) -> str:
+        """
+        Path of the cached audio for this text, keyed on every option that affects
+        the synthesized audio (voice, model, format and voice settings).
+        """
+        return self._tts_cache_path(text, self._tts_options(voice_id, model_id))
+    
+    def _tts_cache_path(self, text: str, options: dict) -> str:
+        options_key = self._default_tts_key if options is self._default_tts_options else repr(options)
+        key = hashlib.blake2b(f"{options_key}|{text}".encode(), digest_size=16).hexdigest()
+        return os.path.join(config.audio_output_dir, f"tts_{key}.mp3")
     
     def text_to_speech(
         self,
         text: str,
-        outpath: str,
-        voice_id: str = "21m00Tcm4TlvDq8ikWAM",  # Default voice ID (Rachel)
-        model_id: str = "eleven_monolingual_v1",
+        outpath: Optional[str] = None,
+        voice_id: Optional[str] = None,
+        model_id: Optional[str] = None,
     ) -> str:
         """
         Convert text to speech and save as an audio file using ElevenLabs API.
+        Audio is cached on disk, so repeating a prompt costs a file copy instead
+        of an API call.
         
         Args:
             text (str): The text to convert to speech.
-            output_path (str): Path where the output audio file will be saved.
-            voice_id (str, optional): ID of the voice to use. Defaults to "21m00Tcm4TlvDq8ikWAM" (Rachel).
-            model_id (str, optional): ID of the model to use. Defaults to "eleven_monolingual_v1".
-            stability (float, optional): Stability parameter (0.0 to 1.0). Defaults to 0.5.
-            similarity_boost (float, optional): Similarity boost parameter (0.0 to 1.0). Defaults to 0.75.
+            outpath (str, optional): Path where the output audio file will be saved.
+                                   If omitted, the cached file's path is returned.
+            voice_id (str, optional): ID of the voice to use. Defaults to config.voice_id.
+            model_id (str, optional): ID of the model to use. Defaults to config.model_id.
             
         Returns:
             str: Path to the generated audio file.
             
         Raises:
-            requests.exceptions.RequestException: If the API request fails.
+            httpx.HTTPError: If the API request fails.
             ValueError: If the API response is not successful.
         """
-        audio = self.client.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
-            model_id=model_id,
-            output_format="mp3_44100_128",
-            voice_settings=VoiceSettings(
-                stability=0.0,
-                similarity_boost=1.0,
-                style=0.0,
-                use_speaker_boost=True,
-                speed=0.85,
-            ),
+        options = self._tts_options(voice_id, model_id)
+        cache_path = self._tts_cache_path(text, options)
+        if not os.path.exists(cache_path):
+            audio = self.client.text_to_speech.convert(
+                text=text,
+                **options,
+                request_options=DOWNLOAD_REQUEST_OPTIONS,
+            )
+            with _cache_writer(cache_path) as f:
+                f.writelines(audio)
+        if outpath is None:
+            return cache_path
+        shutil.copyfile(cache_path, outpath)
+        print("Auto generated audio saved at: ", outpath)
+        return outpath
+
+    async def text_to_speech_async(
+        self,
+        text: str,
+        outpath: Optional[str] = None,
+        voice_id: Optional[str] = None,
+        model_id: Optional[str] = None,
+    ) -> str:
+        """
+        Async variant of text_to_speech that reuses a pooled HTTP connection,
+        so several requests can be in flight at once from the same event loop.
+        Shares text_to_speech's disk cache.
+        
+        Args:
+            text (str): The text to convert to speech.
+            outpath (str, optional): Path where the output audio file will be saved.
+                                   If omitted, the cached file's path is returned.
+            voice_id (str, optional): ID of the voice to use. Defaults to config.voice_id.
+            model_id (str, optional): ID of the model to use. Defaults to config.model_id.
+            
+        Returns:
+            str: Path to the generated audio file.
+        """
+        return await self._run_on_client_loop(
+            self._text_to_speech_async(text, outpath, voice_id, model_id)
         )
-        with open(outpath, "wb") as f:
-            for chunk in audio:
-                f.write(chunk)
+
+    async def _text_to_speech_async(
+        self,
+        text: str,
+        outpath: Optional[str],
+        voice_id: Optional[str],
+        model_id: Optional[str],
+    ) -> str:
+        options = self._tts_options(voice_id, model_id)
+        cache_path = self._tts_cache_path(text, options)
+        if not os.path.exists(cache_path):
+            audio = self._get_async_client().text_to_speech.convert(
+                text=text,
+                **options,
+                request_options=DOWNLOAD_REQUEST_OPTIONS,
+            )
+            partial_path = _partial_path(cache_path)
+            try:
+                async with aiofiles.open(partial_path, "wb") as f:
+                    async for chunk in audio:
+                        await f.write(chunk)
+                os.replace(partial_path, cache_path)
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+        if outpath is None:
+            return cache_path
+        await asyncio.to_thread(shutil.copyfile, cache_path, outpath)
         print("Auto generated audio saved at: ", outpath)
-        return audio
+        return outpath
+
+    def text_to_speech_stream(
+        self,
+        text: str,
+        outpath: Optional[str] = None,
+        voice_id: Optional[str] = None,
+        model_id: Optional[str] = None,
+    ) -> Iterator[bytes]:
+        """
+        Stream synthesized speech chunk by chunk, so playback can start on the
+        first chunk instead of after the whole MP3 has been generated. Cached
+        audio is replayed from disk; new audio is added to the cache once the
+        stream has been fully read.
+
+        Args:
+            text (str): The text to convert to speech.
+            outpath (str, optional): If given, the audio is also saved to this file
+                                   once the stream has been fully read.
+            voice_id (str, optional): ID of the voice to use. Defaults to config.voice_id.
+            model_id (str, optional): ID of the model to use. Defaults to config.model_id.
+
+        Returns:
+            Iterator[bytes]: MP3 audio chunks, suitable for elevenlabs.stream().
+        """
+        options = self._tts_options(voice_id, model_id)
+        cache_path = self._tts_cache_path(text, options)
+        if os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                yield from iter(lambda: f.read(DOWNLOAD_REQUEST_OPTIONS["chunk_size"]), b"")
+        else:
+            audio = self.client.text_to_speech.stream(text=text, **options)
+            with _cache_writer(cache_path) as f:
+                for chunk in audio:
+                    f.write(chunk)
+                    yield chunk
+        if outpath is not None:
+            shutil.copyfile(cache_path, outpath)
 
     def transcribe_audio(
         self,
-        audio_file_path: str,
+        audio_file: Union[str, BinaryIO],
         model_id: str = "scribe_v1"
     ) -> str:
         """
         Transcribe an audio file using ElevenLabs API.
         
         Args:
-            audio_file_path (str): Path to the audio file to transcribe.
+            audio_file (str or file-like): Path to the audio file to transcribe, or an
+                                   open binary file-like object (e.g. io.BytesIO) holding the audio.
             model_id (str, optional): ID of the model to use for transcription. 
                                    Defaults to "eleven_monolingual_v1".
         
@@ -97,18 +338,91 @@ class ElevenLabsTranscriber:
             
         Raises:
             FileNotFoundError: If the audio file doesn't exist.
-            requests.exceptions.RequestException: If the API request fails.
+            httpx.HTTPError: If the API request fails.
             ValueError: If the API response doesn't contain the expected data.
         """
-        if not os.path.isfile(audio_file_path):
-            raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
+        if isinstance(audio_file, (str, os.PathLike)):
+            if not os.path.isfile(audio_file):
+                raise FileNotFoundError(f"Audio file not found: {audio_file}")
+            # Hand the open file to the uploader so it streams from disk in chunks
+            # instead of being read into memory first
+            audio_source = open(audio_file, "rb")
+        else:
+            # Already open (e.g. an in-memory recording), upload it as-is
+            audio_source = contextlib.nullcontext(audio_file)
         
-        with open(audio_file_path, "rb") as audio_file:
-            audio_data = io.BytesIO(audio_file.read())
+        with audio_source as audio_data:
             response = self.client.speech_to_text.convert(
                 file=audio_data,
                 model_id=model_id,
+                # Noise-only clips come back empty instead of as "(background noise)"
+                tag_audio_events=False,
             )
-            print(response)
-            # return the transcribed text
-            return response.text
+        print(response)
+        # return the transcribed text
+        return response.text
+
+    async def transcribe_audio_async(
+        self,
+        audio_file: Union[str, BinaryIO],
+        model_id: str = "scribe_v1"
+    ) -> str:
+        """
+        Async variant of transcribe_audio that reuses a pooled HTTP connection.
+        
+        Args:
+            audio_file (str or file-like): Path to the audio file, or an open binary file-like object.
+            model_id (str, optional): ID of the model to use for transcription.
+        
+        Returns:
+            str: The transcribed text.
+            
+        Raises:
+            FileNotFoundError: If the audio file doesn't exist.
+        """
+        return await self._run_on_client_loop(self._transcribe_audio_async(audio_file, model_id))
+
+    async def _transcribe_audio_async(self, audio_file: Union[str, BinaryIO], model_id: str) -> str:
+        if isinstance(audio_file, (str, os.PathLike)):
+            if not os.path.isfile(audio_file):
+                raise FileNotFoundError(f"Audio file not found: {audio_file}")
+            audio_source = open(audio_file, "rb")
+        else:
+            audio_source = contextlib.nullcontext(audio_file)
+        
+        with audio_source as audio_data:
+            response = await self._get_async_client().speech_to_text.convert(
+                file=audio_data,
+                model_id=model_id,
+                # Noise-only clips come back empty instead of as "(background noise)"
+                tag_audio_events=False,
+            )
+        return response.text
+
+    async def transcribe_many(
+        self,
+        audio_files: List[Union[str, BinaryIO]],
+        model_id: str = "scribe_v1"
+    ) -> List[str]:
+        """
+        Transcribe several audio files concurrently over the pooled async client,
+        instead of waiting a full round trip for each one in turn. At most
+        MAX_CONCURRENT_TRANSCRIPTIONS uploads are in flight at once.
+        
+        Args:
+            audio_files (list): Paths or open binary file-like objects to transcribe.
+            model_id (str, optional): ID of the model to use for transcription.
+        
+        Returns:
+            List[str]: The transcribed texts, in the same order as audio_files.
+            
+        Raises:
+            FileNotFoundError: If any of the audio files doesn't exist.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSCRIPTIONS)
+        
+        async def transcribe_one(audio_file: Union[str, BinaryIO]) -> str:
+            async with semaphore:
+                return await self.transcribe_audio_async(audio_file, model_id)
+        
+        return list(await asyncio.gather(*(transcribe_one(audio_file) for audio_file in audio_files)))
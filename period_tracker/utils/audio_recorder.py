@@ -1,74 +1,193 @@
-import sounddevice as sd
 import numpy as np
-import wavio as wv
-from pynput import keyboard
 import threading
 import sys
+import io
+import os
+import queue
+import wave
+
+try:
+    import msvcrt  # Windows console input
+except ImportError:
+    msvcrt = None
+    import select
+    import termios
+    import tty
 
 # --- Configuration for Recording ---
-SAMPLERATE = 44100  # Samples per second (standard CD quality)
+SAMPLERATE = 16000  # Samples per second (speech recognition runs at 16 kHz, so more is just upload bytes)
 CHANNELS = 1        # Number of audio channels (2 for stereo, 1 for mono)
 DTYPE = 'int16'     # Data type for audio samples (16-bit integers are common)
 CHUNK_SIZE = 1024   # Number of frames read per buffer (affects latency and processing chunks)
 
-# --- Global Variables and Events ---
-# Event to signal when to stop recording. Set by the keyboard listener.
-stop_recording_event = threading.Event()
+# --- Configuration for Segmented Transcription ---
+SEGMENT_SECONDS = 10      # Hand a segment to the transcriber roughly this often while recording
+SILENCE_THRESHOLD = 500   # Peak int16 amplitude below which a chunk counts as quiet
+SILENCE_STOP_SECONDS = 0.7  # Pause after speech that ends the recording when stop_on_silence is set
+
+def is_quiet(data):
+    """Return True if a chunk of int16 samples contains no speech-level peaks."""
+    return np.abs(data).max() < SILENCE_THRESHOLD
 
-# List to store the recorded audio frames (chunks of audio data).
-audio_frames = []
+def open_wav(target):
+    """Open a WAV writer set up for the recording format."""
+    wav_file = wave.open(target, "wb")
+    wav_file.setnchannels(CHANNELS)
+    wav_file.setsampwidth(np.dtype(DTYPE).itemsize)
+    wav_file.setframerate(SAMPLERATE)
+    return wav_file
 
-# --- Keyboard Listener Callback ---
-def on_press(key):
+def write_wav(target, audio):
     """
-    Callback function executed when a keyboard key is pressed.
-    Checks if the pressed key is 'x' and signals the recording to stop.
+    Write recorded int16 samples as WAV. The samples are already in the file's
+    sample format, so their bytes are written as-is with no conversion pass.
+
+    Args:
+        target (str or file-like): Path or writable binary file object.
+        audio (np.ndarray): Samples shaped (frames, CHANNELS).
     """
-    try:
-        # Check if the pressed key is the character 'x'
-        if hasattr(key, 'char') and key.char == 'x':
-            print("\n'x' key pressed. Stopping recording...")
-            # Set the event to signal the recording loop to stop
-            stop_recording_event.set()
-            # Return False to stop the keyboard listener thread
-            return False
-    except AttributeError:
-        # Ignore special keys (like Shift, Ctrl, etc.) that don't have a 'char' attribute
-        pass
+    with open_wav(target) as wav_file:
+        wav_file.writeframes(audio.tobytes())
+
+def encode_wav(audio):
+    """
+    Encode recorded int16 samples as an in-memory WAV file.
+
+    Args:
+        audio (np.ndarray): Samples shaped (frames, CHANNELS).
+
+    Returns:
+        io.BytesIO: WAV data positioned at the start, ready to upload.
+    """
+    buffer = io.BytesIO()
+    write_wav(buffer, audio)
+    buffer.seek(0)
+    return buffer
+
+# --- Terminal Key Polling ---
+def read_key():
+    """
+    Return a key typed on the terminal since the last call, or None.
+    Never blocks, so it can be polled from the recording loop. On POSIX the
+    terminal must be in cbreak mode for keys to arrive without Enter.
+    """
+    if msvcrt is not None:
+        return msvcrt.getwch() if msvcrt.kbhit() else None
+    if select.select([sys.stdin], [], [], 0)[0]:
+        # Read the fd directly; sys.stdin's buffer would hide pending input from select
+        return os.read(sys.stdin.fileno(), 1).decode(errors="ignore")
+    return None
 
 # --- Audio Recording Function ---
-def record_audio_until_x(filename="recorded_audio.wav"):
+def record_audio_until_x(filename="recorded_audio.wav", stop_event=None, on_segment=None, stop_on_silence=False,
+                         watch_keys=True):
     """
-    Records audio from the microphone until the 'x' key is pressed,
-    then saves the recording to a WAV file.
+    Records audio from the microphone until the 'x' key is pressed on the
+    terminal (or stop_event is set), writing it to a WAV file as it is captured.
+    Keys are only watched when stdin is an interactive terminal.
 
     Args:
         filename (str): The name of the file to save the audio to (e.g., "my_clip.wav").
                         Defaults to "recorded_audio.wav".
+        stop_event (threading.Event, optional): Event another thread can set to stop
+                        the recording. A fresh one is created if not given.
+        on_segment (callable, optional): Called from the recording thread with each
+                        completed segment (np.ndarray of samples) so it can be transcribed
+                        while recording continues. Segments are about SEGMENT_SECONDS long
+                        and cut on a quiet chunk where possible so words aren't split;
+                        the final partial segment is delivered after recording stops.
+        stop_on_silence (bool): Also stop once the speaker has been quiet for
+                        SILENCE_STOP_SECONDS after saying something, so short notes
+                        don't wait for the 'x' key. Defaults to False.
+        watch_keys (bool): Watch the terminal for the 'x' key. Pass False when the
+                        recording is controlled through stop_event, so the process's
+                        terminal is left alone. Defaults to True.
+
+    Returns:
+        str or None: The filename, or None if nothing was recorded (the file is removed).
     """
-    global audio_frames # Access the global list to store frames
+    # Imported here so that importing this module (e.g. for encode_wav on the API
+    # server) doesn't load PortAudio, which isn't present on headless machines
+    import sounddevice as sd
+
+    # Event to signal when to stop recording. Set on 'x', on silence or by the caller.
+    if stop_event is None:
+        stop_event = threading.Event()
+
+    # Chunks go straight to the WAV file, so only the frame count is kept here
+    wav_file = None
+    recorded_length = 0
+    # Frames of the segment currently being built for on_segment
+    segment_frames = []
+    segment_length = 0
+    segment_target = SEGMENT_SECONDS * SAMPLERATE
+    # Silence tracking for stop_on_silence; nothing counts until speech is heard
+    heard_speech = False
+    quiet_length = 0
+    silence_stop_length = int(SILENCE_STOP_SECONDS * SAMPLERATE)
+
+    # Poll the terminal for 'x' instead of installing a global keyboard hook
+    watch_keys = watch_keys and sys.stdin is not None and sys.stdin.isatty()
+    terminal_attrs = None
 
     print("Starting audio recording...")
-    print(f"Press the 'x' key on your keyboard to stop recording and save.")
+    if watch_keys:
+        print(f"Press the 'x' key on your keyboard to stop recording and save.")
 
-    # Start the keyboard listener in a separate thread.
-    # This allows the script to listen for key presses while recording audio.
-    listener = keyboard.Listener(on_press=on_press)
-    listener.start()
+    # Chunks handed over by the audio callback, with their input-overflow flag
+    audio_queue = queue.Queue()
+
+    def audio_callback(indata, frames, time_info, status):
+        # Runs on PortAudio's thread: copy the chunk out and return straight away, so
+        # slow disk writes or segment callbacks below can't make the input overflow
+        audio_queue.put((indata.copy(), status.input_overflow))
 
     # --- Audio Recording Loop ---
     try:
+        if watch_keys and msvcrt is None:
+            # cbreak mode delivers keys as they are typed, without waiting for Enter
+            terminal_attrs = termios.tcgetattr(sys.stdin.fileno())
+            tty.setcbreak(sys.stdin.fileno())
+        wav_file = open_wav(filename)
         # Use sounddevice.InputStream to capture audio from the default input device.
         # The 'with' statement ensures the stream is properly closed even if errors occur.
-        with sd.InputStream(samplerate=SAMPLERATE, channels=CHANNELS, dtype=DTYPE, blocksize=CHUNK_SIZE) as stream:
+        with sd.InputStream(samplerate=SAMPLERATE, channels=CHANNELS, dtype=DTYPE, blocksize=CHUNK_SIZE,
+                            callback=audio_callback):
             print("Recording active...")
-            # Loop as long as the stop_recording_event has not been set
-            while not stop_recording_event.is_set():
-                # Read a block of audio data from the stream.
-                # This call blocks until a chunk of audio is available.
-                data, overflowed = stream.read(CHUNK_SIZE)
-                # Append the recorded data chunk to our list of frames
-                audio_frames.append(data)
+            # Loop as long as the stop event has not been set
+            while not stop_event.is_set():
+                if watch_keys and read_key() == "x":
+                    print("\n'x' key pressed. Stopping recording...")
+                    stop_event.set()
+                    break
+                # Wait for the next chunk, waking up regularly to notice the stop event
+                try:
+                    data, overflowed = audio_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                # Write the chunk out now rather than holding the whole recording in memory.
+                # writeframesraw skips the per-call header fix-up; close() does it once.
+                wav_file.writeframesraw(data.tobytes())
+                recorded_length += len(data)
+                quiet = is_quiet(data)
+                if stop_on_silence:
+                    if not quiet:
+                        heard_speech = True
+                        quiet_length = 0
+                    elif heard_speech:
+                        quiet_length += len(data)
+                        if quiet_length >= silence_stop_length:
+                            print("\nSilence detected. Stopping recording...")
+                            stop_event.set()
+                if on_segment is not None:
+                    segment_frames.append(data)
+                    segment_length += len(data)
+                    # Cut on a quiet chunk once the segment is long enough, or force
+                    # a cut if the speaker hasn't paused for a whole extra segment
+                    if segment_length >= segment_target and (quiet or segment_length >= 2 * segment_target):
+                        on_segment(np.concatenate(segment_frames, axis=0))
+                        segment_frames = []
+                        segment_length = 0
                 # Check for buffer overflow - indicates the system can't keep up
                 if overflowed:
                     print("Warning: Audio input buffer overflowed!")
@@ -77,30 +196,54 @@ def record_audio_until_x(filename="recorded_audio.wav"):
         # Catch any exceptions that occur during recording (e.g., no input device)
         print(f"\nAn error occurred during recording: {e}")
         # Ensure the stop event is set so the script doesn't hang
-        stop_recording_event.set()
+        stop_event.set()
 
     finally:
         # --- Stopping and Saving ---
-        # Wait for the keyboard listener thread to finish (after 'x' was pressed and on_press returned False)
-        listener.join()
+        # Give the terminal back its normal line-buffered mode
+        if terminal_attrs is not None:
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, terminal_attrs)
+
+        if wav_file is not None:
+            try:
+                # Closing writes the final frame count into the WAV header
+                wav_file.close()
+            except Exception as e:
+                # Catch any errors while finishing the file
+                print(f"An error occurred while saving the audio file: {e}")
+                return
 
         # Check if any audio data was actually recorded
-        if not audio_frames:
+        if not recorded_length:
             print("No audio data was recorded.")
+            if wav_file is not None:
+                os.remove(filename)
             return # Exit the function if nothing was recorded
 
         print("Recording stopped.")
-        print("Combining audio frames...")
-        # Concatenate all the recorded NumPy arrays into a single array
-        recorded_audio = np.concatenate(audio_frames, axis=0)
-
-        print(f"Saving audio to {filename}...")
-        try:
-            # Use wavio to write the NumPy array to a WAV file.
-            # wavio automatically handles the correct format based on the dtype of the array.
-            wv.write(filename, recorded_audio, SAMPLERATE, sampwidth=np.dtype(DTYPE).itemsize)
-            print("Audio saved successfully.")
-            return filename
-        except Exception as e:
-            # Catch any errors during the file saving process
-            print(f"An error occurred while saving the audio file: {e}")
+        if on_segment is not None and segment_frames:
+            on_segment(np.concatenate(segment_frames, axis=0))
+
+        print(f"Audio saved to {filename}.")
+        return filename
+
+def start_background_recording(filename):
+    """
+    Starts record_audio_until_x on a daemon thread so the caller (e.g. the
+    Streamlit script thread) is not blocked while the user speaks. The terminal
+    isn't watched for keys; the recording stops when stop_event is set.
+
+    Args:
+        filename (str): The name of the file to save the audio to.
+
+    Returns:
+        tuple: (thread, stop_event). Set stop_event and join the thread to finish
+               the recording; the WAV file is written before the thread exits. If nothing
+               was recorded (e.g. no input device) the file doesn't exist afterwards.
+    """
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=record_audio_until_x, args=(filename, stop_event), kwargs={"watch_keys": False}, daemon=True
+    )
+    thread.start()
+    return thread, stop_event
@@ -1,22 +1,46 @@
-from typing import Dict, List, Optional
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
 from datetime import datetime
-import uuid
+
+import orjson
+
+from .ids import next_id
+from .text_processor import format_period_summary, missing_required_fields
+
+@dataclass(slots=True)
+class LogEntry:
+    """A log stored in a session, with the metadata computed when it was written"""
+    timestamp: str           # ISO timestamp of when the log was added
+    data: Dict               # Extracted period information
+    summary: str             # Human-readable summary from format_period_summary
+    has_missing_data: bool
+    unusual_symptoms: bool
 
 class PeriodDataStore:
     def __init__(self):
         """Initialize the data store with empty collections"""
         self.sessions: Dict[str, Dict] = {}  # Session ID -> Session Data
         self.current_session_id: Optional[str] = None
+        # get_recent_logs results per limit, cleared whenever a log is written
+        self._recent_logs_cache: Dict[int, List[Dict]] = {}
+        # Session IDs by status and the total log count, kept up to date for get_stats
+        self._active_sessions: Set[str] = set()
+        self._completed_sessions: Set[str] = set()
+        self._total_logs = 0
 
     def create_session(self) -> str:
         """Create a new session"""
-        session_id = str(uuid.uuid4())
+        session_id = next_id()
         self.sessions[session_id] = {
             "session_id": session_id,
             "start_time": datetime.now().isoformat(),
             "logs": [],
+            # Running counts of flagged logs, so stats don't rescan the logs
+            "missing_count": 0,
+            "unusual_count": 0,
             "status": "active"
         }
+        self._active_sessions.add(session_id)
         self.current_session_id = session_id
         return session_id
 
@@ -25,12 +49,9 @@ class PeriodDataStore:
         if session_id not in self.sessions:
             raise ValueError(f"Session {session_id} not found")
             
-        self.sessions[session_id]["logs"].append({
-            "timestamp": datetime.now().isoformat(),
-            "data": log_data
-        })
+        self._append_log(self.sessions[session_id], log_data)
 
-    def get_session_logs(self, session_id: str) -> List[Dict]:
+    def get_session_logs(self, session_id: str) -> List[LogEntry]:
         """Get all logs for a specific session"""
         if session_id not in self.sessions:
             raise ValueError(f"Session {session_id} not found")
@@ -42,35 +63,26 @@ class PeriodDataStore:
         if self.current_session_id not in self.sessions:
             raise ValueError("No active session")
             
-        # Add metadata about the log
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "data": log_data,
-            "has_missing_data": self._check_for_missing_data(log_data),
-            "unusual_symptoms": log_data.get("unusual_symptoms", False)
-        }
+        self._append_log(self.sessions[self.current_session_id], log_data)
         
-        # Add to session logs
-        self.sessions[self.current_session_id]["logs"].append(log_entry)
+    def _append_log(self, session: Dict, log_data: Dict) -> None:
+        """Append a log entry with its metadata to a session and update the session's counts"""
+        log_entry = LogEntry(
+            timestamp=datetime.now().isoformat(),
+            data=log_data,
+            summary=format_period_summary(log_data),
+            has_missing_data=self._check_for_missing_data(log_data),
+            unusual_symptoms=bool(log_data.get("unusual_symptoms", False))
+        )
+        session["logs"].append(log_entry)
+        session["missing_count"] += log_entry.has_missing_data
+        session["unusual_count"] += log_entry.unusual_symptoms
+        self._total_logs += 1
+        self._recent_logs_cache.clear()
         
     def _check_for_missing_data(self, log_data: Dict) -> bool:
         """Check if the log data has any missing required fields"""
-        required_fields = {
-            "period": ["status", "flow"],
-            "timing": ["date"]
-        }
-        
-        # Check period information
-        period_data = log_data.get("period", {})
-        if not any(period_data.get(field) for field in required_fields["period"]):
-            return True
-            
-        # Check timing
-        timing_data = log_data.get("timing", {})
-        if not any(timing_data.get(field) for field in required_fields["timing"]):
-            return True
-            
-        return False
+        return bool(missing_required_fields(log_data))
 
     def get_session_data(self, session_id: str) -> Dict:
         """Get complete session data including logs"""
@@ -84,15 +96,36 @@ class PeriodDataStore:
             "end_time": session_data.get("end_time"),
             "status": session_data["status"],
             "logs": session_data["logs"],
-            "has_missing_data": any(log["has_missing_data"] for log in session_data["logs"]),
-            "has_unusual_symptoms": any(log["unusual_symptoms"] for log in session_data["logs"])
+            "has_missing_data": session_data["missing_count"] > 0,
+            "has_unusual_symptoms": session_data["unusual_count"] > 0
         }
         
-    def get_session_history(self, session_id: str) -> List[Dict]:
+    def dump_session(self, session_id: str) -> bytes:
+        """Serialize complete session data to JSON bytes with orjson"""
+        return orjson.dumps(self.get_session_data(session_id))
+
+    def get_session_history(self, session_id: str) -> List[LogEntry]:
         """Get all logs for a specific session"""
         session_data = self.get_session_data(session_id)
         return session_data["logs"]
 
+    def get_recent_logs(self, limit: int = 5) -> List[Dict]:
+        """Get the most recent logs across all sessions, newest first"""
+        cached = self._recent_logs_cache.get(limit)
+        if cached is None:
+            cached = []
+            for session in reversed(self.sessions.values()):
+                for log in reversed(session["logs"]):
+                    # Summaries are formatted once when the log is written
+                    cached.append({"date": log.timestamp[:10], "summary": log.summary})
+                    if len(cached) >= limit:
+                        break
+                if len(cached) >= limit:
+                    break
+            self._recent_logs_cache[limit] = cached
+        # Hand out a copy so callers can't modify the cached list
+        return list(cached)
+
     def get_current_session_id(self) -> Optional[str]:
         """Get the current active session ID"""
         return self.current_session_id
@@ -102,32 +135,27 @@ class PeriodDataStore:
         if session_id in self.sessions:
             self.sessions[session_id]["end_time"] = datetime.now().isoformat()
             self.sessions[session_id]["status"] = "completed"
-            self.current_session_id = None
+            self._active_sessions.discard(session_id)
+            self._completed_sessions.add(session_id)
             # Clear current session if this was the active one
             if self.current_session_id == session_id:
                 self.current_session_id = None
 
     def get_stats(self) -> Dict:
         """Get statistics about the data store"""
-        active_sessions = [s for s in self.sessions.values() if s["status"] == "active"]
-        completed_sessions = [s for s in self.sessions.values() if s["status"] == "completed"]
-        
         # Calculate statistics
-        total_logs = sum(len(session["logs"]) for session in self.sessions.values())
         sessions_with_missing_data = sum(
-            1 for session in self.sessions.values() 
-            if any(log["has_missing_data"] for log in session["logs"])
+            session["missing_count"] > 0 for session in self.sessions.values()
         )
         sessions_with_unusual_symptoms = sum(
-            1 for session in self.sessions.values() 
-            if any(log["unusual_symptoms"] for log in session["logs"])
+            session["unusual_count"] > 0 for session in self.sessions.values()
         )
         
         return {
             "total_sessions": len(self.sessions),
-            "active_sessions": len(active_sessions),
-            "completed_sessions": len(completed_sessions),
-            "total_logs": total_logs,
+            "active_sessions": len(self._active_sessions),
+            "completed_sessions": len(self._completed_sessions),
+            "total_logs": self._total_logs,
             "sessions_with_missing_data": sessions_with_missing_data,
             "sessions_with_unusual_symptoms": sessions_with_unusual_symptoms
         }
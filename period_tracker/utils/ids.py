@@ -0,0 +1,37 @@
+import collections
+import itertools
+import os
+import time
+import uuid
+from typing import Optional
+
+# File names from next_file_name are unique but predictable (a per-process prefix
+# and a counter instead of a uuid4 per file), so they must never be what keeps a
+# file private: the API only serves content-hashed tts_*.mp3 replies, never these.
+# next() on itertools.count is atomic under the GIL, so this is thread-safe.
+_PROCESS_PREFIX = f"{os.getpid()}_{int(time.time())}"
+_file_counter = itertools.count()
+
+def next_file_name(suffix: str, prefix: Optional[str] = None) -> str:
+    """
+    Return a file name that is unique within this process.
+
+    Args:
+        suffix: File extension including the dot, e.g. ".wav".
+        prefix: Optional prefix such as a session ID; defaults to a per-process prefix.
+    """
+    return f"{prefix or _PROCESS_PREFIX}_{next(_file_counter)}{suffix}"
+
+# Session IDs are handed to clients, so they stay random uuid4s, but they are
+# generated in batches to keep the urandom reads off the per-request path.
+_ID_POOL_SIZE = 256
+_id_pool = collections.deque()
+
+def next_id() -> str:
+    """Return a random uuid4 string from a pool that is refilled in batches."""
+    while True:
+        try:
+            return _id_pool.popleft()
+        except IndexError:
+            # Another thread may refill at the same time, which only over-fills the pool
+            _id_pool.extend(str(uuid.uuid4()) for _ in range(_ID_POOL_SIZE))
@@ -1,29 +1,73 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Set
+import copy
+import functools
+import hashlib
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from ..config.settings import config
 import openai
+import orjson
 import os
 from datetime import datetime
-from dotenv import load_dotenv
+from ..config.env import load_env
 
 # Load environment variables
-load_dotenv()
+load_env()
 
-def extract_period_info(text: str) -> Dict[str, any]:
+# Extraction results keyed on a hash of the normalized transcript. Repeated
+# utterances ("started my period today") skip the LLM round trip entirely.
+# Guarded by a lock since callers run this from worker threads.
+_EXTRACTION_CACHE: Dict[str, Dict[str, any]] = {}
+_EXTRACTION_CACHE_LOCK = threading.Lock()
+_EXTRACTION_CACHE_SIZE = 1024
+# Most extraction requests extract_period_info_batch keeps in flight at once
+_BATCH_WORKERS = 4
+
+def _compile_keywords(keywords: List[str]) -> "re.Pattern":
+    """Compile a keyword list into one case-insensitive alternation, matched as substrings"""
+    return re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE)
+
+# Every configured keyword mapped to its labels, and one pattern matching any of them.
+# The lookahead doesn't consume text, so overlapping keywords ("light spotting" and
+# "spotting") are all found in a single pass; longer keywords are tried first.
+_KEYWORD_LABELS: Dict[str, Set[str]] = {}
+for _label, _keywords in config.keywords.items():
+    for _keyword in _keywords:
+        _KEYWORD_LABELS.setdefault(_keyword.lower(), set()).add(_label)
+_KEYWORDS_RE = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_KEYWORD_LABELS, key=len, reverse=True))) + "))",
+    re.IGNORECASE
+)
+
+def extract_labels(text: str) -> Set[str]:
+    """Return the config.keywords labels (e.g. "flow_heavy") whose keywords appear in the text"""
+    labels = set()
+    for match in _KEYWORDS_RE.finditer(text):
+        labels |= _KEYWORD_LABELS[match.group(1).lower()]
+    return labels
+
+# Indicators that a symptom should be flagged for a healthcare professional
+_UNUSUAL_SYMPTOMS_RE = _compile_keywords([
+    "severe", "extreme", "unusual", "abnormal",
+    "heavy bleeding", "intense pain", "fainting",
+    "dizziness", "fever", "vomiting"
+])
+
+@functools.cache
+def _get_client() -> openai.OpenAI:
     """
-    Extract comprehensive period-related information from text using advanced NLP.
-    
-    Args:
-        text: The transcribed text from voice input
-        
-    Returns:
-        Dict containing extracted period information with confidence scores
+    Return the shared OpenAI client, so every extraction reuses its connection
+    pool. Created on first use rather than at import, since the constructor
+    raises when OPENAI_API_KEY isn't set.
     """
-    # Initialize OpenAI client
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
-    # Define system prompt for comprehensive analysis
-    system_prompt = """You are a health tracker assistant. Your task is to extract health metrics from natural language input about menstrual cycles and related symptoms. 
+    return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# JSON mode (response_format json_object) needs gpt-4-turbo or later; base gpt-4 rejects it
+_EXTRACTION_MODEL = "gpt-4-turbo"
+
+# System prompt for comprehensive analysis
+_SYSTEM_PROMPT = """You are a health tracker assistant. Your task is to extract health metrics from natural language input about menstrual cycles and related symptoms. 
     
     Metrics to track:
     1. Period Status:
@@ -80,123 +124,199 @@ def extract_period_info(text: str) -> Dict[str, any]:
     7. If the user mentions unusual symptoms (severe, extreme, unusual, abnormal, heavy bleeding, intense pain, fainting, dizziness, fever, vomiting), flag them as unusual
     8. Always include the unusual_symptoms flag in the output
     """
+
+def extract_period_info(text: str) -> Dict[str, any]:
+    """
+    Extract comprehensive period-related information from text using advanced NLP.
+    
+    Results are cached per day on the normalized text, since relative dates
+    ("yesterday") resolve differently on another day.
+    
+    Args:
+        text: The transcribed text from voice input
+        
+    Returns:
+        Dict containing extracted period information with confidence scores
+    """
+    normalized = text.strip().lower()
+    key = hashlib.sha256(f"{datetime.now():%Y-%m-%d}|{normalized}".encode()).hexdigest()
+    with _EXTRACTION_CACHE_LOCK:
+        cached = _EXTRACTION_CACHE.get(key)
+    if cached is not None:
+        # Callers update the result in place, so never hand out the cached dict
+        return copy.deepcopy(cached)
     
-    # Get current date for context
-    current_date = datetime.now().strftime("%Y-%m-%d")
+    result = _extract_period_info(text)
+    
+    # Don't cache keyword fallbacks from a failed LLM call, the next call may succeed
+    if "error" not in result:
+        with _EXTRACTION_CACHE_LOCK:
+            if len(_EXTRACTION_CACHE) >= _EXTRACTION_CACHE_SIZE:
+                _EXTRACTION_CACHE.pop(next(iter(_EXTRACTION_CACHE)))
+            _EXTRACTION_CACHE[key] = copy.deepcopy(result)
+    return result
+
+def extract_period_info_batch(texts: List[str]) -> List[Dict[str, any]]:
+    """
+    Extract period information from several texts at once.
+    
+    Each distinct text is extracted once, with up to _BATCH_WORKERS requests
+    in flight over the shared client, so a batch costs about as long as its
+    slowest request rather than the sum of them. Results go through the same
+    cache as extract_period_info.
+    
+    Args:
+        texts: Transcribed texts to extract from
+        
+    Returns:
+        One result dict per text, in the same order as texts
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    if not unique_texts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(_BATCH_WORKERS, len(unique_texts))) as pool:
+        extracted = dict(zip(unique_texts, pool.map(extract_period_info, unique_texts)))
+    
+    results = []
+    seen = set()
+    for text in texts:
+        # Repeated texts get their own copy, since callers update results in place
+        results.append(copy.deepcopy(extracted[text]) if text in seen else extracted[text])
+        seen.add(text)
+    return results
+
+def _keyword_extract(text: str) -> Dict[str, any]:
+    """
+    Basic keyword matching, in the same shape as an LLM extraction. Makes one
+    pass over the text with the precompiled keyword pattern.
+    """
+    result = {
+        "period": {},
+        "symptoms": [],
+        "mood": [],
+        "timing": {},
+        "confidence": 0.5,
+        "raw_text": text.strip(),
+        "unusual_symptoms": False
+    }
+    
+    # Lighter flows first
+    labels = extract_labels(text)
+    for flow in ("light", "medium", "heavy"):
+        if f"flow_{flow}" in labels:
+            result["period"] = {"flow": flow}
+            break
+    
+    return result
+
+def _extract_period_info(text: str) -> Dict[str, any]:
+    """Run the LLM extraction (with keyword fallback) without consulting the cache"""
     
     try:
         # Call OpenAI API for advanced analysis
-        response = client.chat.completions.create(
-            model="gpt-4",
+        response = _get_client().chat.completions.create(
+            model=_EXTRACTION_MODEL,
+            # The model is constrained to emit a JSON object, which is parsed as data
+            # instead of being run through eval()
+            response_format={"type": "json_object"},
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": _SYSTEM_PROMPT},
                 {"role": "user", "content": text}
             ]
         )
         
-        result = eval(response.choices[0].message.content)
+        result = orjson.loads(response.choices[0].message.content)
         
-        # Initialize unusual symptoms flag
-        result["unusual_symptoms"] = False
-        
-        # Check for unusual symptoms in symptoms
-        if "symptoms" in result:
-            unusual_symptoms = [
-                "severe", "extreme", "unusual", "abnormal", 
-                "heavy bleeding", "intense pain", "fainting", 
-                "dizziness", "fever", "vomiting"
-            ]
-            
-            # Check symptom types for unusual symptoms
-            for symptom in result["symptoms"]:
-                if any(us in symptom.get("type", "").lower() for us in unusual_symptoms):
-                    result["unusual_symptoms"] = True
-                    break
-            
-            # Also check symptom descriptions for unusual indicators
-            for symptom in result["symptoms"]:
-                if any(us in symptom.get("severity", "").lower() for us in unusual_symptoms):
-                    result["unusual_symptoms"] = True
-                    break
+        # Flag unusual symptoms found in either the symptom types or their severity
+        result["unusual_symptoms"] = has_unusual_symptoms(result.get("symptoms"))
         
         return result
         
     except Exception as e:
         # Fallback to basic keyword matching if OpenAI fails
-        result = {
-            "period": {},
-            "symptoms": [],
-            "mood": [],
-            "timing": {},
-            "confidence": 0.5,
-            "raw_text": text.strip(),
-            "error": str(e),
-            "unusual_symptoms": False
-        }
-        
-        # Basic keyword matching as backup
-        if any(keyword in text.lower() for keyword in config.keywords["flow_light"]):
-            result["period"] = {"flow": "light"}
-        elif any(keyword in text.lower() for keyword in config.keywords["flow_medium"]):
-            result["period"] = {"flow": "medium"}
-        elif any(keyword in text.lower() for keyword in config.keywords["flow_heavy"]):
-            result["period"] = {"flow": "heavy"}
-        
+        result = _keyword_extract(text)
+        result["error"] = str(e)
         return result
 
+def missing_required_fields(data: Dict[str, any]) -> List[str]:
+    """
+    Return which required pieces of information the period data lacks:
+    "period" without a status or flow, and "date" without a date.
+    """
+    missing_fields = []
+    period_data = data.get("period") or {}
+    if not (period_data.get("status") or period_data.get("flow")):
+        missing_fields.append("period")
+    timing_data = data.get("timing") or {}
+    if not timing_data.get("date"):
+        missing_fields.append("date")
+    return missing_fields
+
+def has_unusual_symptoms(symptoms: List[Dict[str, any]]) -> bool:
+    """Whether any symptom's type or severity mentions an unusual symptom keyword"""
+    return any(
+        _UNUSUAL_SYMPTOMS_RE.search(symptom.get("type") or "")
+        or _UNUSUAL_SYMPTOMS_RE.search(symptom.get("severity") or "")
+        for symptom in symptoms or []
+        if isinstance(symptom, dict)
+    )
+
 def format_period_summary(log_data: Dict[str, any]) -> str:
-    """Format period log data into a human-readable summary"""
+    """
+    Format period log data into a human-readable summary. LLM output may set any
+    field to null, so values (not just keys) are checked before formatting.
+    """
     summary_parts = []
     
     # Format period information
-    if "period" in log_data:
-        period = log_data["period"]
-        if "status" in period:
-            summary_parts.append(f"Period Status: {period['status'].title()}")
-        if "flow" in period:
-            summary_parts.append(f"Flow: {period['flow'].title()}")
-        if "duration" in period:
-            summary_parts.append(f"Duration: {period['duration']} days")
+    period = log_data.get("period") or {}
+    if period.get("status"):
+        summary_parts.append(f"Period Status: {str(period['status']).title()}")
+    if period.get("flow"):
+        summary_parts.append(f"Flow: {str(period['flow']).title()}")
+    if period.get("duration"):
+        summary_parts.append(f"Duration: {period['duration']} days")
     
     # Format symptoms with severity
-    if "symptoms" in log_data:
-        symptom_parts = []
-        for symptom in log_data["symptoms"]:
-            symptom_str = symptom["type"].title()
-            if "severity" in symptom:
-                symptom_str += f" ({symptom['severity']})"
-            symptom_parts.append(symptom_str)
-        if symptom_parts:
-            summary_parts.append(f"Symptoms: {', '.join(symptom_parts)}")
+    symptom_parts = []
+    for symptom in log_data.get("symptoms") or []:
+        if not isinstance(symptom, dict) or not symptom.get("type"):
+            continue
+        symptom_str = str(symptom["type"]).title()
+        if symptom.get("severity"):
+            symptom_str += f" ({symptom['severity']})"
+        symptom_parts.append(symptom_str)
+    if symptom_parts:
+        summary_parts.append(f"Symptoms: {', '.join(symptom_parts)}")
     
     # Format mood with intensity
-    if "mood" in log_data:
-        mood_parts = []
-        for mood in log_data["mood"]:
-            mood_str = mood["state"].title()
-            if "intensity" in mood:
-                mood_str += f" ({mood['intensity']})"
-            mood_parts.append(mood_str)
-        if mood_parts:
-            summary_parts.append(f"Mood: {', '.join(mood_parts)}")
+    mood_parts = []
+    for mood in log_data.get("mood") or []:
+        if not isinstance(mood, dict) or not mood.get("state"):
+            continue
+        mood_str = str(mood["state"]).title()
+        if mood.get("intensity"):
+            mood_str += f" ({mood['intensity']})"
+        mood_parts.append(mood_str)
+    if mood_parts:
+        summary_parts.append(f"Mood: {', '.join(mood_parts)}")
     
     # Add timing information
-    if "timing" in log_data and log_data["timing"]:
-        timing = log_data["timing"]
-        timing_parts = []
-        if "date" in timing:
-            timing_parts.append(f"Date: {timing['date']}")
-        if "time_of_day" in timing:
-            timing_parts.append(f"Time: {timing['time_of_day'].title()}")
-        if timing_parts:
-            summary_parts.append(" | ".join(timing_parts))
+    timing = log_data.get("timing") or {}
+    timing_parts = []
+    if timing.get("date"):
+        timing_parts.append(f"Date: {timing['date']}")
+    if timing.get("time_of_day"):
+        timing_parts.append(f"Time: {str(timing['time_of_day']).title()}")
+    if timing_parts:
+        summary_parts.append(" | ".join(timing_parts))
     
     # Add unusual symptoms flag
     if log_data.get("unusual_symptoms", False):
         summary_parts.append("⚠️ Unusual symptoms detected")
     
     # Add confidence score
-    if "confidence" in log_data:
+    if isinstance(log_data.get("confidence"), (int, float)):
         summary_parts.append(f"Confidence: {log_data['confidence']:.2f}")
     
     return "\n".join(summary_parts) if summary_parts else "No specific details recorded."
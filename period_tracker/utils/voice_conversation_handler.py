@@ -1,29 +1,28 @@
+import asyncio
 import os
+import shutil
 from typing import Dict, List, Optional
-from datetime import datetime
 from pathlib import Path
-import tempfile
 import subprocess
 
-from dotenv import load_dotenv
+from ..config.env import load_env
 from ..elevenlabs_transcriber import ElevenLabsTranscriber
-from .text_processor import extract_period_info, format_period_summary
+from .text_processor import extract_period_info, has_unusual_symptoms, missing_required_fields
 from .data_store import PeriodDataStore
 
-load_dotenv()
+load_env()
 
 class VoiceConversationHandler:
-    def __init__(self, audio_output_dir: str = "audio_output"):
+    def __init__(self, audio_output_dir: str = "audio_output", transcriber: Optional[ElevenLabsTranscriber] = None):
         """Initialize the voice conversation handler"""
+        self.transcriber = transcriber or ElevenLabsTranscriber()
         self.audio_output_dir = Path(audio_output_dir)
         self.audio_output_dir.mkdir(parents=True, exist_ok=True)
         self.current_question = 0
         self.max_questions = 5
         self.conversation_history = []
-        self.required_fields = {
-            "period": ["status", "flow"],
-            "timing": ["date"]
-        }
+        # Speech syntheses started ahead of time, keyed on the question text
+        self._speech_tasks: Dict[str, asyncio.Task] = {}
         
         # Initialize data store
         self.data_store = PeriodDataStore()
@@ -32,20 +31,30 @@ class VoiceConversationHandler:
         # Create a new session
         self.session_id = self.data_store.create_session()
 
-    def _convert_text_to_speech(self, text: str) -> str:
+    def _prefetch_speech(self, text: str) -> asyncio.Task:
+        """Start synthesizing text into the transcriber's cache, reusing a synthesis already started"""
+        task = self._speech_tasks.get(text)
+        if task is None:
+            task = asyncio.create_task(self.transcriber.text_to_speech_async(text))
+            self._speech_tasks[text] = task
+        return task
+
+    async def _convert_text_to_speech(self, text: str) -> str:
         """Convert text to speech and save as MP3"""
         audio_path = self.audio_output_dir / f"question_{self.current_question}.mp3"
-        ElevenLabsTranscriber().text_to_speech(text, str(audio_path))
+        cache_path = await self._prefetch_speech(text)
+        await asyncio.to_thread(shutil.copyfile, cache_path, audio_path)
         return str(audio_path)
 
     def _play_audio(self, audio_path: str) -> None:
-        """Play audio file using system player"""
+        """Hand an audio file to the system player and return without waiting for it"""
         try:
             # Use appropriate command based on OS
             if os.name == 'nt':  # Windows
-                subprocess.run(['start', '', audio_path], shell=True)
+                # Opens with the default app directly, without starting a cmd.exe shell
+                os.startfile(audio_path)
             elif os.name == 'posix':  # Unix/Linux
-                subprocess.run(['xdg-open', audio_path])
+                subprocess.Popen(['xdg-open', audio_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             else:
                 raise ValueError(f"Unsupported OS: {os.name}")
         except Exception as e:
@@ -53,31 +62,12 @@ class VoiceConversationHandler:
 
     def _check_required_fields(self, data: Dict) -> List[str]:
         """Check if all required fields are present in the data"""
-        missing_fields = []
+        missing_fields = missing_required_fields(data)
         
-        # Check period information
-        period_data = data.get("period", {})
-        if not any(period_data.get(field) for field in self.required_fields["period"]):
-            missing_fields.append("period")
-            
-        # Check timing
-        timing_data = data.get("timing", {})
-        if not any(timing_data.get(field) for field in self.required_fields["timing"]):
-            missing_fields.append("date")
-            
         # Check for unusual symptoms
-        if "symptoms" in data:
-            unusual_symptoms = [
-                "severe", "extreme", "unusual", "abnormal", 
-                "heavy bleeding", "intense pain", "fainting", 
-                "dizziness", "fever", "vomiting"
-            ]
-            
-            for symptom in data["symptoms"]:
-                if any(us in symptom.get("type", "").lower() for us in unusual_symptoms):
-                    data["unusual_symptoms"] = True
-                    break
-            
+        if has_unusual_symptoms(data.get("symptoms")):
+            data["unusual_symptoms"] = True
+
         return missing_fields
 
     def _generate_followup_question(self, missing_fields: List[str], current_data: Dict) -> str:
@@ -96,18 +86,28 @@ class VoiceConversationHandler:
             
         return "Is there anything else you'd like to add about your symptoms or mood?"
 
-    def process_conversation(self, initial_text: str) -> Dict:
-        """Process a conversation with follow-up questions until all required information is gathered"""
+    async def process_conversation(self, initial_text: str) -> Dict:
+        """
+        Process a conversation with follow-up questions until all required information is gathered.
+        Run it with asyncio.run(handler.process_conversation(text)). While the user answers,
+        the questions that could come next are synthesized in the background.
+        """
+        try:
+            return await self._process_conversation(initial_text)
+        finally:
+            # Syntheses belong to this event loop; drop any that weren't needed
+            for task in self._speech_tasks.values():
+                task.cancel()
+            self._speech_tasks.clear()
+
+    async def _process_conversation(self, initial_text: str) -> Dict:
         # Start with initial text
         self.conversation_history.append({"role": "user", "content": initial_text})
         
         # Extract initial information
-        result = extract_period_info(initial_text)
-        
-        # Check for unusual symptoms
-        self._check_required_fields(result)  # This will set unusual_symptoms flag if needed
+        result = await asyncio.to_thread(extract_period_info, initial_text)
         
-        # Check for missing fields
+        # Check for missing fields (this also sets the unusual_symptoms flag if needed)
         missing_fields = self._check_required_fields(result)
         
         while missing_fields and self.current_question < self.max_questions:
@@ -115,29 +115,31 @@ class VoiceConversationHandler:
             question = self._generate_followup_question(missing_fields, result)
             
             # Convert question to speech
-            audio_path = self._convert_text_to_speech(question)
+            audio_path = await self._convert_text_to_speech(question)
             
             # Play the question
-            self._play_audio(audio_path)
+            await asyncio.to_thread(self._play_audio, audio_path)
+            
+            # The next question asks for whichever of these fields the answer leaves out,
+            # so synthesize those while the user is answering
+            for field in missing_fields:
+                self._prefetch_speech(self._generate_followup_question([field], result))
             
             # Add question to conversation history
             self.conversation_history.append({"role": "assistant", "content": question})
             
             # Get user response (this would be replaced with actual voice input in production)
-            user_response = input("\nUser (type your response): ")
+            user_response = await asyncio.to_thread(input, "\nUser (type your response): ")
             
             # Process response
             self.conversation_history.append({"role": "user", "content": user_response})
             
             # Update result with new information
-            new_info = extract_period_info(user_response)
-            
-            # Check for unusual symptoms in new info
-            self._check_required_fields(new_info)  # This will set unusual_symptoms flag if needed
+            new_info = await asyncio.to_thread(extract_period_info, user_response)
             
             result.update(new_info)
             
-            # Check again for missing fields
+            # Check again for missing fields, flagging unusual symptoms in the new info
             missing_fields = self._check_required_fields(result)
             self.current_question += 1
             
@@ -0,0 +1,112 @@
+from period_tracker.utils.data_store import PeriodDataStore
+
+COMPLETE_LOG = {"period": {"flow": "heavy"}, "timing": {"date": "2024-05-01"}}
+MISSING_DATE_LOG = {"period": {"status": "start"}, "timing": {}}
+UNUSUAL_LOG = {**COMPLETE_LOG, "unusual_symptoms": True}
+
+
+def test_stats_and_session_data_follow_adds_and_ends():
+    """Incrementally maintained counts match what a full scan of the store would give"""
+    store = PeriodDataStore()
+    first = store.create_session()
+    store.add_log_to_session(first, MISSING_DATE_LOG)
+    store.add_log_to_session(first, UNUSUAL_LOG)
+    second = store.create_session()
+    store.add_log_to_history(COMPLETE_LOG)
+
+    assert store.get_stats() == {
+        "total_sessions": 2,
+        "active_sessions": 2,
+        "completed_sessions": 0,
+        "total_logs": 3,
+        "sessions_with_missing_data": 1,
+        "sessions_with_unusual_symptoms": 1,
+    }
+
+    first_data = store.get_session_data(first)
+    assert first_data["has_missing_data"] is True
+    assert first_data["has_unusual_symptoms"] is True
+    second_data = store.get_session_data(second)
+    assert second_data["has_missing_data"] is False
+    assert second_data["has_unusual_symptoms"] is False
+
+    store.end_session(first)
+    # Ending twice must not count the session twice
+    store.end_session(first)
+    stats = store.get_stats()
+    assert stats["active_sessions"] == 1
+    assert stats["completed_sessions"] == 1
+    assert store.get_session_data(first)["status"] == "completed"
+    assert store.get_session_data(first)["end_time"] is not None
+
+
+def test_end_session_only_clears_its_own_current_session():
+    store = PeriodDataStore()
+    first = store.create_session()
+    second = store.create_session()
+    store.end_session(first)
+    assert store.get_current_session_id() == second
+    store.end_session(second)
+    assert store.get_current_session_id() is None
+
+
+def test_recent_logs_are_invalidated_on_write():
+    store = PeriodDataStore()
+    session_id = store.create_session()
+    store.add_log_to_session(session_id, MISSING_DATE_LOG)
+    assert len(store.get_recent_logs()) == 1
+
+    store.add_log_to_session(session_id, COMPLETE_LOG)
+    logs = store.get_recent_logs()
+    assert len(logs) == 2
+    # Newest first
+    assert "Heavy" in logs[0]["summary"]
+
+    store.add_log_to_history(MISSING_DATE_LOG)
+    assert len(store.get_recent_logs()) == 3
+    assert len(store.get_recent_logs(limit=2)) == 2
+
+
+def test_recent_logs_cache_is_not_exposed():
+    store = PeriodDataStore()
+    session_id = store.create_session()
+    store.add_log_to_session(session_id, COMPLETE_LOG)
+    store.get_recent_logs().clear()
+    assert len(store.get_recent_logs()) == 1
+
+
+def test_logs_with_null_fields_are_stored():
+    store = PeriodDataStore()
+    session_id = store.create_session()
+    store.add_log_to_session(session_id, {
+        "period": {"status": "start", "flow": None},
+        "timing": {"date": "2024-05-01", "time_of_day": None},
+        "symptoms": None,
+    })
+    assert store.get_stats()["total_logs"] == 1
+    assert store.get_session_data(session_id)["has_missing_data"] is False
+
+
+def test_dump_session_round_trips_log_entries():
+    import orjson
+
+    store = PeriodDataStore()
+    session_id = store.create_session()
+    store.add_log_to_session(session_id, COMPLETE_LOG)
+    store.add_log_to_session(session_id, UNUSUAL_LOG)
+
+    dumped = orjson.loads(store.dump_session(session_id))
+    assert dumped["session_id"] == session_id
+    assert dumped["has_unusual_symptoms"] is True
+    entries = store.get_session_logs(session_id)
+    assert dumped["logs"] == [
+        {
+            "timestamp": entry.timestamp,
+            "data": entry.data,
+            "summary": entry.summary,
+            "has_missing_data": entry.has_missing_data,
+            "unusual_symptoms": entry.unusual_symptoms,
+        }
+        for entry in entries
+    ]
+    assert dumped["logs"][1]["data"] == UNUSUAL_LOG
@@ -0,0 +1,26 @@
+import asyncio
+
+from period_tracker import elevenlabs_transcriber
+from period_tracker.elevenlabs_transcriber import ElevenLabsTranscriber
+
+
+def test_transcribe_many_keeps_order_and_bounds_concurrency(monkeypatch):
+    transcriber = ElevenLabsTranscriber(api_key="test-key")
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_transcribe(audio_file, model_id="scribe_v1"):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        # Later files finish first, so gathering in completion order would show up
+        await asyncio.sleep(0.01 * (20 - int(audio_file.split("_")[1])))
+        in_flight -= 1
+        return f"text for {audio_file} with {model_id}"
+
+    monkeypatch.setattr(transcriber, "transcribe_audio_async", fake_transcribe)
+
+    audio_files = [f"note_{i}" for i in range(20)]
+    texts = asyncio.run(transcriber.transcribe_many(audio_files, model_id="test-model"))
+    assert texts == [f"text for {name} with test-model" for name in audio_files]
+    assert max_in_flight == elevenlabs_transcriber.MAX_CONCURRENT_TRANSCRIPTIONS
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    """Import the API module with a placeholder key, creating its data directories in a temp dir"""
+    from period_tracker.config.settings import ensure_data_dirs
+
+    saved_key = os.environ.get("ELEVEN_LABS_API_KEY")
+    os.environ.setdefault("ELEVEN_LABS_API_KEY", "test-key")
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("server"))
+    try:
+        from period_tracker.api import server
+        yield server
+    finally:
+        os.chdir(cwd)
+        if saved_key is None:
+            os.environ.pop("ELEVEN_LABS_API_KEY", None)
+        # The memoized directory setup ran inside the temp dir; let it run again
+        ensure_data_dirs.cache_clear()
+
+
+def test_check_missing_fields_returns_flat_pairs(server):
+    assert server.check_missing_fields({}) == [
+        ("period", "flow"),
+        ("period", "status"),
+        ("timing", "date"),
+    ]
+    assert server.check_missing_fields({
+        "period": {"status": "start", "flow": "light"},
+        "timing": {"date": "2024-05-01"},
+    }) == []
+
+
+def test_check_missing_fields_ignores_non_dict_values(server):
+    assert server.check_missing_fields({
+        "period": {"flow": "light"},
+        "timing": None,
+        "symptoms": [],
+    }) == [("period", "status"), ("timing", "date")]
+
+
+def test_unknown_session_is_rejected_before_streaming(server):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(server.app)
+    response = client.post(
+        "/api/period-tracker/process-audio",
+        files={"file": ("note.wav", b"RIFF")},
+        data={"session_id": "bogus"},
+    )
+    assert response.status_code == 404
+
+
+def test_only_reply_audio_is_served(server):
+    from fastapi.testclient import TestClient
+    from period_tracker.config.settings import config
+
+    reply_name = "tts_" + "0" * 32 + ".mp3"
+    with open(os.path.join(config.audio_output_dir, reply_name), "wb") as f:
+        f.write(b"reply")
+    recording_name = "input_" + server.next_file_name(".wav")
+    with open(os.path.join(config.audio_input_dir, recording_name), "wb") as f:
+        f.write(b"voice")
+
+    client = TestClient(server.app)
+    reply = client.get(f"{server.AUDIO_URL_PREFIX}/{reply_name}")
+    assert reply.status_code == 200
+    assert reply.content == b"reply"
+    assert "public" not in reply.headers["cache-control"]
+    assert client.get(f"{server.AUDIO_URL_PREFIX}/{recording_name}").status_code == 404
+
+
+def test_followup_audio_url_is_a_public_url(server, monkeypatch):
+    import asyncio
+    import io
+
+    async def transcribe(audio_file):
+        return "light flow"
+
+    async def prompt_audio(text):
+        return os.path.join("data", "audio", "tts_" + "1" * 32 + ".mp3")
+
+    monkeypatch.setattr(server.transcriber, "transcribe_audio_async", transcribe)
+    monkeypatch.setattr(server, "extract_period_info", lambda text: {"period": {"flow": "light"}})
+    monkeypatch.setattr(server, "get_prompt_audio", prompt_audio)
+    # Treat the speculative prompts as cached so nothing is synthesized
+    monkeypatch.setattr(server, "PROMPT_CACHE", dict.fromkeys(server.SPECULATIVE_PROMPTS, ""))
+
+    async def collect():
+        return [event async for event in server.process_audio(io.BytesIO(b"RIFF"))]
+
+    events = asyncio.run(collect())
+    expected_url = f"{server.AUDIO_URL_PREFIX}/tts_{'1' * 32}.mp3"
+    assert {"type": "audio_url", "url": expected_url} in events
+    result = events[-1]["result"]
+    assert result["status"] == "needs_more_info"
+    assert result["audio_url"] == expected_url
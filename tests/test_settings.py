@@ -0,0 +1,25 @@
+import pytest
+
+from period_tracker.config.settings import get_config
+
+
+@pytest.fixture
+def fresh_config():
+    """Rebuild the memoized config from the test's environment, and again afterwards"""
+    get_config.cache_clear()
+    yield get_config
+    get_config.cache_clear()
+
+
+def test_environment_overrides_are_parsed(monkeypatch, fresh_config):
+    monkeypatch.setenv("PERIOD_TRACKER_MODEL_ID", "eleven_multilingual_v2")
+    monkeypatch.setenv("PERIOD_TRACKER_OPTIMIZE_STREAMING_LATENCY", "3")
+    config = fresh_config()
+    assert config.model_id == "eleven_multilingual_v2"
+    assert config.optimize_streaming_latency == 3
+
+
+def test_malformed_override_names_the_variable(monkeypatch, fresh_config):
+    monkeypatch.setenv("PERIOD_TRACKER_OPTIMIZE_STREAMING_LATENCY", "fast")
+    with pytest.raises(ValueError, match="PERIOD_TRACKER_OPTIMIZE_STREAMING_LATENCY: 'fast'"):
+        fresh_config()
@@ -97,5 +97,126 @@ def test_text_processor():
                 if result.get(key) != test['fallback'][key]:
                     print(f"\n⚠️ Warning: Fallback value mismatch for {key}. Expected: {test['fallback'][key]}, Got: {result.get(key)}")
 
+
+def test_format_period_summary_skips_null_fields():
+    """The LLM may return null for any optional field; those are left out of the summary"""
+    summary = format_period_summary({
+        "period": {"status": None, "flow": "light", "duration": None},
+        "symptoms": [{"type": "cramps", "severity": None}, {"type": None}],
+        "mood": None,
+        "timing": {"date": "2024-05-01", "time_of_day": None},
+        "confidence": None,
+    })
+    assert summary == "Flow: Light\nSymptoms: Cramps\nDate: 2024-05-01"
+    assert format_period_summary({"period": None, "timing": None}) == "No specific details recorded."
+
+
+def test_extract_labels_finds_overlapping_keywords():
+    """"light spotting" contains "spotting"; both keywords are matched in a single pass"""
+    from period_tracker.utils.text_processor import extract_labels
+
+    labels = extract_labels("Just some LIGHT SPOTTING and cramping today")
+    assert labels == {"spotting", "mood_cramps"}
+    assert "flow_heavy" in extract_labels("a heavy period with heavy bleeding")
+    assert extract_labels("nothing to report") == set()
+
+
+def test_missing_required_fields():
+    from period_tracker.utils.text_processor import missing_required_fields
+
+    assert missing_required_fields({}) == ["period", "date"]
+    assert missing_required_fields({"period": None, "timing": None}) == ["period", "date"]
+    assert missing_required_fields({"period": {"flow": "light"}, "timing": {}}) == ["date"]
+    assert missing_required_fields({
+        "period": {"status": "start"},
+        "timing": {"date": "2024-05-01"},
+    }) == []
+
+
+def test_extraction_cache_returns_copies_per_day(monkeypatch):
+    from datetime import datetime
+    from period_tracker.utils import text_processor
+
+    calls = []
+
+    def fake_extract(text):
+        calls.append(text)
+        return {"period": {"flow": "light"}, "symptoms": []}
+
+    class FakeDatetime:
+        today = datetime(2024, 5, 1)
+
+        @classmethod
+        def now(cls):
+            return cls.today
+
+    monkeypatch.setattr(text_processor, "_extract_period_info", fake_extract)
+    monkeypatch.setattr(text_processor, "datetime", FakeDatetime)
+    monkeypatch.setattr(text_processor, "_EXTRACTION_CACHE", {})
+
+    first = text_processor.extract_period_info("Light flow today")
+    first["period"]["flow"] = "heavy"
+    second = text_processor.extract_period_info("  light flow TODAY ")
+    assert calls == ["Light flow today"]
+    assert second["period"]["flow"] == "light"
+    assert second is not first
+
+    # Relative dates resolve differently on another day, so the cache misses
+    FakeDatetime.today = datetime(2024, 5, 2)
+    text_processor.extract_period_info("Light flow today")
+    assert len(calls) == 2
+
+
+def test_keyword_fallback_results_are_not_cached(monkeypatch):
+    from period_tracker.utils import text_processor
+
+    calls = []
+
+    def failing_extract(text):
+        calls.append(text)
+        return {"period": {}, "error": "no API key"}
+
+    monkeypatch.setattr(text_processor, "_extract_period_info", failing_extract)
+    monkeypatch.setattr(text_processor, "_EXTRACTION_CACHE", {})
+
+    text_processor.extract_period_info("spotting")
+    text_processor.extract_period_info("spotting")
+    assert len(calls) == 2
+
+
+def test_extract_period_info_batch_keeps_order_and_copies_repeats(monkeypatch):
+    from period_tracker.utils import text_processor
+
+    calls = []
+
+    def fake_extract(text):
+        calls.append(text)
+        return {"period": {"flow": text}, "symptoms": []}
+
+    monkeypatch.setattr(text_processor, "_extract_period_info", fake_extract)
+    monkeypatch.setattr(text_processor, "_EXTRACTION_CACHE", {})
+
+    texts = ["light", "heavy", "light", "medium", "light"]
+    results = text_processor.extract_period_info_batch(texts)
+    assert [result["period"]["flow"] for result in results] == texts
+    assert sorted(calls) == ["heavy", "light", "medium"]
+
+    # Callers update results in place, so repeated texts must not share a dict
+    results[0]["period"]["flow"] = "changed"
+    assert results[2]["period"]["flow"] == "light"
+    assert results[2] is not results[4]
+    assert text_processor.extract_period_info_batch([]) == []
+
+
+def test_has_unusual_symptoms_checks_type_and_severity():
+    from period_tracker.utils.text_processor import has_unusual_symptoms
+
+    assert has_unusual_symptoms([{"type": "Intense pain"}])
+    assert has_unusual_symptoms([{"type": "cramps", "severity": "severe"}])
+    assert not has_unusual_symptoms([{"type": "cramps", "severity": "mild"}])
+    assert not has_unusual_symptoms([{"type": None, "severity": None}])
+    assert not has_unusual_symptoms(None)
+
+
 if __name__ == "__main__":
     test_text_processor()